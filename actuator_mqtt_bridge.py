@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 # actuator_mqtt_bridge.py - daljinska komanda preko MQTT/TLS.
+# Komanda u bilo kom formatu iz codec.py (ContentType ili prvi bajt payload-a).
 
-import os, ssl, json, time, uuid, csv
+import os, ssl, time, uuid, queue, threading
 from datetime import datetime
 import paho.mqtt.client as mqtt
 from pathlib import Path
+from log_writer import CsvLog, exit_on_sigterm
+from servo_smart_blind import ACT_COLS, Servo
+import codec
 
 TOPIC_CMD = os.getenv("ACT_TOPIC", "iot/actuator/servo/set")
 BROKER = os.getenv("MQTT_HOST", "localhost")
@@ -16,45 +20,61 @@ CERT = os.getenv("MQTT_CERT", "")
 KEY = os.getenv("MQTT_KEY", "")
 CLIENT_ID = f"act-bridge-{uuid.uuid4().hex[:8]}"
 LOG = Path(os.getenv("ACT_LOG", "actuator_log.csv"))
-FAKE = os.getenv("FAKE_SERVO", "0") == "1"
+QUEUE_MAX = int(os.getenv("ACT_QUEUE", "8"))
 
-def ensure_log_header():
-    if not LOG.exists():
-        with LOG.open("w", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(["ts","reason","angle","lux","motion"])
+log = None
+cmds = queue.Queue(maxsize=max(1, QUEUE_MAX))
 
-def set_servo_angle(angle_deg, pin=18, freq=50):
-    if FAKE:
-        return True
-    try:
-        import RPi.GPIO as GPIO
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(pin, GPIO.OUT)
-        pwm = GPIO.PWM(pin, freq)
-        pwm.start(0)
-        duty = 2 + (angle_deg/18.0)
-        pwm.ChangeDutyCycle(duty)
-        time.sleep(0.5)
-        pwm.stop()
-        GPIO.cleanup()
-        return True
-    except Exception as e:
-        print("Servo error:", e)
-        return False
+def _ms(dt):
+    return dt * 1000.0
 
 def on_message(client, userdata, msg):
+    # paho callback samo parsira i stavlja komandu u red; servo pomera worker()
     try:
-        data = json.loads(msg.payload.decode("utf-8"))
-        angle = int(data.get("angle", 90))
-        reason = data.get("reason", "remote_cmd")
-        set_servo_angle(angle)
-        with LOG.open("a", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow([datetime.utcnow().isoformat()+"Z", reason, angle, None, None])
+        data = codec.decode_mqtt(msg)
+        cmd = (time.perf_counter(), datetime.utcnow().isoformat()+"Z",
+               data.get("reason", "remote_cmd"), int(data.get("angle", 90)))
     except Exception as e:
         print("Bad message:", e)
+        return
+    while True:
+        try:
+            cmds.put_nowait(cmd)
+            return
+        except queue.Full:
+            drop(cmds)
+
+def drop(q):
+    # najstarija komanda na cekanju se odbacuje (loguje se bez act_ms)
+    try:
+        t_in, ts, reason, angle = q.get_nowait()
+    except queue.Empty:
+        return
+    log.write([ts, reason, angle, None, None, _ms(time.perf_counter() - t_in), None])
+
+def worker(servo):
+    # latest-wins: od komandi koje su se nakupile izvrsava se samo najnovija
+    while True:
+        cmd = cmds.get()
+        while True:
+            try:
+                newer = cmds.get_nowait()
+            except queue.Empty:
+                break
+            t_in, ts, reason, angle = cmd
+            log.write([ts, reason, angle, None, None, _ms(time.perf_counter() - t_in), None])
+            cmd = newer
+        t_in, ts, reason, angle = cmd
+        t0 = time.perf_counter()
+        if servo.move(angle):
+            servo.wait_settled()  # act_ms do kraja smirivanja; nove komande cekaju (latest-wins)
+        log.write([ts, reason, angle, None, None, _ms(t0 - t_in), _ms(time.perf_counter() - t0)])
 
 def main():
-    ensure_log_header()
+    global log
+    exit_on_sigterm()
+    log = CsvLog(LOG, ACT_COLS)
+    threading.Thread(target=worker, args=(Servo(),), name="actuator", daemon=True).start()
     c = mqtt.Client(client_id=CLIENT_ID, protocol=mqtt.MQTTv5)
     if TLS:
         ctx = ssl.create_default_context(cafile=CA if CA else None)
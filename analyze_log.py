@@ -1,41 +1,51 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# analyze_log.py - p50/p95 agregati iz exp_log.csv
-
-import csv, sys
-
-f = sys.argv[1] if len(sys.argv) > 1 else "exp_log.csv"
-
-def pctl(vals, p):
-    if not vals: return None
-    s = sorted(vals)
-    k = int(round((p/100.0)*(len(s)-1)))
-    return s[k]
-
-rtts = {}
-with open(f, newline="", encoding="utf-8") as fh:
-    rd = csv.DictReader(fh)
-    for row in rd:
-        key = f"{row['proto']}|{row['reason']}"
-        v = None
-        if row['proto']=="MQTT" and row.get('mqtt_rtt_ms'):
-            v = float(row['mqtt_rtt_ms'])
-        if row['proto']=="CoAP" and row.get('coap_rtt_ms'):
-            v = float(row['coap_rtt_ms'])
-        if v is None: continue
-        rtts.setdefault(key, []).append(v)
-
-print("key,count,p50_ms,p95_ms")
-for k, vals in rtts.items():
-    print(f"{k},{len(vals)},{pctl(vals,50):.2f},{pctl(vals,95):.2f}")
-
-
-
-
-FAKE = os.getenv("FAKE_SENSORS", "0") == "1"
-
-
-
-
-
-
+# analyze_log.py - p50/p95/p99 agregati iz exp_log.csv
+# Jedan prolaz kroz log (blokovi), LogHistogram sketch po proto|reason kljucu.
+# Sketch-evi se mogu sacuvati (--save) i spojiti izmedju fajlova/run-ova (--load).
+# Primer: python3 analyze_log.py dan1.csv dan2.csv --save mesec.json
+#         python3 analyze_log.py --load mesec.json --load dan3.json
+
+import json, argparse
+import numpy as np
+from log_store import EXP_DATA, iter_chunks, num, text
+from rtt_stats import LogHistogram
+
+def sketch_log(path, sketches):
+    for cols in iter_chunks(path):
+        proto = text(cols, "proto")
+        reason = text(cols, "reason")
+        rtt = np.where(proto == "MQTT", num(cols, "mqtt_rtt_ms"),
+                       np.where(proto == "CoAP", num(cols, "coap_rtt_ms"), np.nan))
+        ok = ~np.isnan(rtt)
+        keys = np.char.add(np.char.add(proto, "|"), reason)[ok]
+        rtt = rtt[ok]
+        for k in dict.fromkeys(keys.tolist()):
+            sketches.setdefault(k, LogHistogram()).update(rtt[keys == k])
+    return sketches
+
+def main():
+    ap = argparse.ArgumentParser(description="p50/p95/p99 RTT po proto|reason")
+    ap.add_argument("logs", nargs="*", help=f"CSV/.bin logovi (podrazumevano {EXP_DATA})")
+    ap.add_argument("--load", action="append", default=[], help="JSON sa ranije sacuvanim sketch-evima")
+    ap.add_argument("--save", help="sacuvaj spojene sketch-eve u JSON")
+    a = ap.parse_args()
+
+    sketches = {}
+    for p in a.load:
+        with open(p, encoding="utf-8") as fh:
+            for k, d in json.load(fh).items():
+                h = LogHistogram.from_dict(d)
+                sketches[k] = sketches[k].merge(h) if k in sketches else h
+    for p in a.logs or ([] if a.load else [EXP_DATA]):
+        sketch_log(p, sketches)
+    if a.save:
+        with open(a.save, "w", encoding="utf-8") as fh:
+            json.dump({k: h.to_dict() for k, h in sketches.items()}, fh)
+
+    print("key,count,p50_ms,p95_ms,p99_ms")
+    for k, h in sketches.items():
+        print(f"{k},{h.count},{h.percentile(50):.2f},{h.percentile(95):.2f},{h.percentile(99):.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,127 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 # coap_client.py - CoAP (DTLS) klijent sa merenjem RTT (echo resource).
+# Payload u formatu PAYLOAD_CODEC (codec.py), naveden u Content-Format opciji.
 
-import os, json, asyncio, time, uuid
+import os, json, socket, asyncio, time
+from urllib.parse import urlsplit
+from collections import deque
 from datetime import datetime
+from rtt_stats import summarize
+import codec as codec_mod
 
 COAP_URL = os.getenv("COAP_URL", "coap://localhost/echo")
 USE_DTLS = os.getenv("COAP_DTLS", "0") == "1"
+PSK_ID = os.getenv("COAP_PSK_ID", "")
+PSK = os.getenv("COAP_PSK", "")
+TIMEOUT = float(os.getenv("COAP_TIMEOUT", "5"))
+PINGS = int(os.getenv("COAP_PINGS", "3"))
+WINDOW = int(os.getenv("COAP_RTT_WINDOW", "100"))
+codec = codec_mod.get()
 
-async def coap_echo():
-    import aiocoap
-    proto = await aiocoap.Context.create_client_context()
-    corr = uuid.uuid4().hex
-    payload = json.dumps({"ts": datetime.utcnow().isoformat()+"Z", "corr": corr}).encode("utf-8")
-    req = aiocoap.Message(code=aiocoap.POST, uri=COAP_URL, payload=payload)
+def dtls_url(url):
+    return "coaps://" + url.split("://", 1)[1] if url.startswith("coap://") else url
+
+async def resolve_url(url):
+    # DNS faza posebno; zahtevi zatim idu na razresenu adresu (bez ponovnog razresavanja)
+    u = urlsplit(url)
+    host = u.hostname or "localhost"
+    port = u.port or (5684 if u.scheme == "coaps" else 5683)
     t0 = time.perf_counter()
-    resp = await proto.request(req).response
-    rtt = (time.perf_counter() - t0) * 1000.0
-    if resp.code.is_successful():
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_DGRAM)
+    dns_ms = (time.perf_counter() - t0) * 1000.0
+    addr = infos[0][4][0]
+    netloc = (f"[{addr}]" if ":" in addr else addr) + (f":{u.port}" if u.port else "")
+    return u._replace(netloc=netloc).geturl(), dns_ms
+
+class CoapProber:
+    # Jedan aiocoap kontekst (i jedna DTLS sesija kada je COAP_DTLS=1) za sve probe;
+    # probe() salje N konkurentnih CON echo zahteva i vraca loss/RTT sazetak batch-a.
+    # Uspostavljanje se meri po fazama (setup): dns, ctx (kreiranje konteksta) i
+    # first (prvi zahtev, ukljucuje DTLS handshake; ne ulazi u RTT uzorke).
+    def __init__(self, url=COAP_URL, pings=PINGS, window=WINDOW):
+        self.url = dtls_url(url) if USE_DTLS else url
+        self.pings = pings
+        self.window = deque(maxlen=window)
+        self.ctx = None
+        self.setup = None
+        self._reported = True
+        self.payload_bytes = None  # velicina poslednjeg kodiranog zahteva
+
+    async def start(self):
+        if self.ctx is None:
+            import aiocoap
+            self.url, dns_ms = await resolve_url(self.url)
+            t0 = time.perf_counter()
+            ctx = await aiocoap.Context.create_client_context()
+            self.setup = {"dns_ms": dns_ms, "ctx_ms": (time.perf_counter() - t0) * 1000.0, "first_ms": None}
+            self._reported = False
+            if USE_DTLS:
+                origin = "/".join(self.url.split("/")[:3])
+                ctx.client_credentials.load_from_dict({
+                    origin + "/*": {"dtls": {"psk": PSK.encode("utf-8"),
+                                             "client-identity": PSK_ID.encode("utf-8")}}})
+            self.ctx = ctx
+        return self.ctx
+
+    async def echo(self):
+        import aiocoap
+        ctx = await self.start()
+        corr = codec.new_corr()
+        payload = codec.encode({"ts": datetime.utcnow().isoformat()+"Z", "corr": corr})
+        self.payload_bytes = len(payload)
+        req = aiocoap.Message(code=aiocoap.POST, mtype=aiocoap.CON, uri=self.url, payload=payload,
+                              content_format=codec.content_format)
+        t0 = time.perf_counter()
+        resp = await ctx.request(req).response
+        rtt = (time.perf_counter() - t0) * 1000.0
+        return corr, (rtt if resp.code.is_successful() else None)
+
+    async def probe(self, n=None, timeout=TIMEOUT):
+        n = self.pings if n is None else n
+        t_end = time.perf_counter() + timeout
+        await self.start()
+        if self.setup["first_ms"] is None:
+            # prvi zahtev posle novog konteksta nosi handshake; meri se posebno
+            _, self.setup["first_ms"] = await asyncio.wait_for(self.echo(), timeout)
+            timeout = max(0.0, t_end - time.perf_counter())
+        tasks = [asyncio.ensure_future(self.echo()) for _ in range(n)]
+        done, pending = await asyncio.wait(tasks, timeout=timeout) if tasks else (set(), set())
+        for t in pending:
+            t.cancel()
+        got = [t.result()[1] for t in done if t.exception() is None and t.result()[1] is not None]
+        self.window.extend(got)
+        out = summarize(got, n)
+        out["rolling"] = summarize(list(self.window))
+        out["setup"] = self.take_setup()
+        out["codec"] = codec.name
+        out["payload_bytes"] = self.payload_bytes
+        return out
+
+    def take_setup(self):
+        if self._reported or self.setup is None or self.setup["first_ms"] is None:
+            return None
+        self._reported = True
+        return dict(self.setup)
+
+    async def close(self):
+        if self.ctx is not None:
+            await self.ctx.shutdown()
+            self.ctx = None
+
+async def coap_echo():
+    prober = CoapProber()
+    try:
+        corr, rtt = await asyncio.wait_for(prober.echo(), TIMEOUT)
+    finally:
+        await prober.close()
+    if rtt is not None:
         print(json.dumps({"ts": datetime.utcnow().isoformat()+"Z",
                           "proto": "CoAP",
                           "rtt_ms": rtt,
-                          "corr": corr}, ensure_ascii=False))
+                          "corr": corr,
+                          "codec": codec.name,
+                          "payload_bytes": prober.payload_bytes}, ensure_ascii=False))
 
 if __name__ == "__main__":
     asyncio.run(coap_echo())
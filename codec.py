@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# codec.py - kodiranje payload-a za probe, telemetriju i komande (PAYLOAD_CODEC):
+#   json    podrazumevano, format nepromenjen (ISO ts, 32-hex corr); encode(compact=True)
+#           bez razmaka (telemetrija)
+#   cbor    RFC 8949 preko cbor2 (opciono), ts = int ms, corr = u32
+#   packed  struct po vrsti poruke (ping/cmd/telemetrija), ts = int ms, corr = u32;
+#           telemetrija: merenja kao float32, ostala polja stavki (error_*, *_age_ms) u JSON dodatku
+# Primalac bira codec po MQTT v5 ContentType, CoAP Content-Format, ili po prvom
+# bajtu (json '{', cbor mapa 0xA0-0xBF, packed vrsta 0x00-0x03).
+# python3 codec.py ispisuje velicine tipicnih poruka po codec-u.
+
+import os, sys, json, math, uuid, random, struct
+from datetime import datetime, timezone
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+CODEC = os.getenv("PAYLOAD_CODEC", "json")
+
+# packed: prvi bajt je vrsta poruke
+K_JSON, K_PING, K_CMD, K_TEL = 0, 1, 2, 3
+_PING = struct.Struct("<BqI")      # vrsta, ts_ms, corr
+_CMD = struct.Struct("<BqhB")      # vrsta, ts_ms, angle, len(reason) + reason
+_TEL = struct.Struct("<BB")        # vrsta, broj stavki; zatim len(dev) + dev
+_ITEM = struct.Struct("<qfffb")    # ts_ms, temperature, humidity, lux, motion (-1 = nema)
+_EXT = struct.Struct("<H")         # opciono posle stavki: duzina + JSON lista ostalih polja po stavci
+_ITEM_KEYS = {"ts", "temperature", "humidity", "lux", "motion", "dev"}
+
+def ts_ms(ts):
+    # ISO-8601 (sa ili bez 'Z') ili vec int ms -> int ms od epohe
+    if ts is None or isinstance(ts, (int, float)):
+        return int(ts or 0)
+    dt = datetime.fromisoformat(ts[:-1] if ts.endswith("Z") else ts)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+def _compact(d):
+    # ts -> int ms, i u ugnjezdenim stavkama (batch telemetrije)
+    out = {k: (ts_ms(v) if k == "ts" else v) for k, v in d.items()}
+    if isinstance(out.get("items"), list):
+        out["items"] = [_compact(i) for i in out["items"]]
+    return out
+
+def _f(v):
+    return float("nan") if v is None else float(v)
+
+def _unf(v):
+    return None if math.isnan(v) else round(v, 3)
+
+class JsonCodec:
+    name, content_type, content_format = "json", "application/json", 50
+
+    def new_corr(self):
+        return uuid.uuid4().hex
+
+    def encode(self, d, compact=False):
+        seps = (",", ":") if compact else None
+        return json.dumps(d, ensure_ascii=False, separators=seps).encode("utf-8")
+
+    def decode(self, data):
+        return json.loads(data.decode("utf-8") if isinstance(data, (bytes, bytearray)) else data)
+
+    def mqtt_properties(self):
+        from paho.mqtt.properties import Properties
+        from paho.mqtt.packettypes import PacketTypes
+        p = Properties(PacketTypes.PUBLISH)
+        p.ContentType = self.content_type
+        return p
+
+class CborCodec(JsonCodec):
+    name, content_type, content_format = "cbor", "application/cbor", 60
+
+    def new_corr(self):
+        return random.getrandbits(32)
+
+    def encode(self, d, compact=False):
+        return cbor2.dumps(_compact(d))
+
+    def decode(self, data):
+        return cbor2.loads(data)
+
+class PackedCodec(JsonCodec):
+    # poznate vrste poruka kao fiksni struct; ostalo kao K_JSON + kompaktni JSON
+    name, content_type, content_format = "packed", "application/vnd.iot-edge.packed", 65000
+
+    def new_corr(self):
+        return random.getrandbits(32)
+
+    def encode(self, d, compact=False):
+        if isinstance(d.get("corr"), int) and set(d) <= {"ts", "corr", "ping"}:
+            return _PING.pack(K_PING, ts_ms(d.get("ts")), d["corr"])
+        if "angle" in d:
+            reason = d.get("reason", "").encode("utf-8")[:255]
+            return _CMD.pack(K_CMD, ts_ms(d.get("ts")), int(d["angle"]), len(reason)) + reason
+        items = d["items"] if "items" in d else [d] if "lux" in d or "temperature" in d else None
+        if items is not None and len(items) < 256:
+            dev = str(d.get("dev", "")).encode("utf-8")[:255]
+            out = [_TEL.pack(K_TEL, len(items)), bytes([len(dev)]), dev]
+            for i in items:
+                m = i.get("motion")
+                out.append(_ITEM.pack(ts_ms(i.get("ts")), _f(i.get("temperature")), _f(i.get("humidity")),
+                                      _f(i.get("lux")), -1 if m is None else int(m)))
+            # polja van struct-a (error_*, *_age_ms, ...) idu u JSON dodatak, da packed ne gubi podatke
+            ext = [{k: v for k, v in i.items() if k not in _ITEM_KEYS} for i in items]
+            if any(ext):
+                j = json.dumps(ext, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                if len(j) > 0xFFFF:
+                    return bytes([K_JSON]) + json.dumps(_compact(d), separators=(",", ":")).encode("utf-8")
+                out += [_EXT.pack(len(j)), j]
+            return b"".join(out)
+        return bytes([K_JSON]) + json.dumps(_compact(d), separators=(",", ":")).encode("utf-8")
+
+    def decode(self, data):
+        kind = data[0]
+        if kind == K_PING:
+            _, ts, corr = _PING.unpack_from(data)
+            return {"ts": ts, "corr": corr, "ping": 1}
+        if kind == K_CMD:
+            _, ts, angle, n = _CMD.unpack_from(data)
+            return {"ts": ts, "angle": angle, "reason": data[_CMD.size:_CMD.size + n].decode("utf-8")}
+        if kind == K_TEL:
+            _, count = _TEL.unpack_from(data)
+            n = data[_TEL.size]
+            off = _TEL.size + 1 + n
+            dev = data[_TEL.size + 1:off].decode("utf-8")
+            items = []
+            for k in range(count):
+                ts, t, h, lux, m = _ITEM.unpack_from(data, off + k * _ITEM.size)
+                items.append({"ts": ts, "temperature": _unf(t), "humidity": _unf(h), "lux": _unf(lux),
+                              "motion": None if m < 0 else m})
+            off += count * _ITEM.size
+            if len(data) >= off + _EXT.size:
+                (n,) = _EXT.unpack_from(data, off)
+                ext = json.loads(data[off + _EXT.size:off + _EXT.size + n])
+                for i, e in zip(items, ext):
+                    i.update(e)
+            return {"dev": dev, **items[0]} if count == 1 else {"dev": dev, "n": count, "items": items}
+        return json.loads(data[1:])
+
+CODECS = {c.name: c for c in (JsonCodec, CborCodec, PackedCodec)}
+
+def get(name=CODEC):
+    if name not in CODECS:
+        raise ValueError(f"nepoznat codec {name!r} (json, cbor, packed)")
+    if name == "cbor" and cbor2 is None:
+        raise ValueError("PAYLOAD_CODEC=cbor trazi paket cbor2 (pip install cbor2)")
+    return CODECS[name]()
+
+def by_content_type(ct):
+    for c in CODECS.values():
+        if c.content_type == ct:
+            return get(c.name)
+    return None
+
+def by_content_format(cf):
+    for c in CODECS.values():
+        if cf is not None and c.content_format == int(cf):
+            return get(c.name)
+    return None
+
+def sniff(data):
+    b = data[0] if data else ord("{")
+    if 0xA0 <= b <= 0xBF and cbor2 is not None:
+        return get("cbor")
+    if b <= K_TEL:
+        return get("packed")
+    return get("json")
+
+def decode_mqtt(msg):
+    ct = getattr(getattr(msg, "properties", None), "ContentType", None)
+    return ((ct and by_content_type(ct)) or sniff(msg.payload)).decode(msg.payload)
+
+def decode_coap(resp):
+    return (by_content_format(resp.opt.content_format) or sniff(resp.payload)).decode(resp.payload)
+
+def main():
+    now = datetime.utcnow().isoformat()+"Z"
+    snap = {"ts": now, "temperature": 21.4, "humidity": 48.2, "lux": 312.5, "motion": 0}
+    samples = {"ping": lambda c: {"ts": now, "corr": c.new_corr(), "ping": 1},
+               "cmd": lambda c: {"ts": now, "reason": "remote_cmd", "angle": 90},
+               "telemetry": lambda c: {"dev": "edge01", **snap},
+               "telemetry_x3": lambda c: {"dev": "edge01", "n": 3, "items": [snap] * 3}}
+    names = [n for n in CODECS if n != "cbor" or cbor2 is not None]
+    print("message".ljust(14) + "".join(n.rjust(9) for n in names))
+    for kind, make in samples.items():
+        sizes = [len(get(n).encode(make(get(n)))) for n in names]
+        print(kind.ljust(14) + "".join(str(s).rjust(9) for s in sizes))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
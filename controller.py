@@ -2,37 +2,88 @@
 # -*- coding: utf-8 -*-
 # controller.py - adaptivna politika (TLS/DTLS, QoS, interval), ping probe, log exp_log.csv, opcioni FORCE_HIGH.
 
-import os, csv, time, json, subprocess
+import os, time, asyncio
 from datetime import datetime
 from pathlib import Path
+import sensor_daemon
+import metrics as metrics_mod
+from log_writer import CsvLog, exit_on_sigterm
 
 LOG = Path(os.getenv("EXP_LOG", "exp_log.csv"))
 INTERVAL_BASE = float(os.getenv("BASE_INTERVAL", "5"))
 FORCE_HIGH = os.getenv("FORCE_HIGH", "0") == "1"
 RTT_BAD_MS = float(os.getenv("RTT_BAD_MS", "150"))
 LUX_PRIVACY_LUX = float(os.getenv("PRIVACY_LUX", "10"))
+CYCLE_DEADLINE = float(os.getenv("CYCLE_DEADLINE", "4"))
+CYCLE_RESERVE = 0.05  # s na kraju ciklusa za log, ne troši ga slanje
+EXP_BIN = os.getenv("EXP_BIN", "0") == "1"  # dodatno <log>.bin (kolonski, vidi log_store.py)
+LOG_COLS = ["ts","proto","secure","qos","interval","reason","privacy",
+            "mqtt_rtt_ms","coap_rtt_ms","temperature","humidity","lux","motion",
+            "t_sense_ms","mqtt_p95_ms","mqtt_loss_pct","coap_p95_ms","coap_loss_pct",
+            # faze uspostavljanja veze (popunjene samo u ciklusu nove veze)
+            "mqtt_dns_ms","mqtt_tcp_ms","mqtt_tls_ms","mqtt_connack_ms","mqtt_suback_ms",
+            "mqtt_tls_resumed","mqtt_tls_resumed_total","coap_dns_ms","coap_ctx_ms","coap_first_ms",
+            # faze ciklusa (metrics.py); t_log_ms/t_cycle_ms su iz prethodnog ciklusa jer se
+            # red upisuje pre kraja tekuceg; drift_ms = stvarni period - zadati interval
+            "t_mqtt_ms","t_coap_ms","t_policy_ms","t_send_ms","t_log_ms","t_cycle_ms","drift_ms",
+            # telemetrija (telemetry.py); prazno kada je snapshot samo baferovan
+            "pub_n","pub_bytes","pub_wire_bytes","pub_ms","pub_ok",
+            # kodirane velicine poruka (codec.py, PAYLOAD_CODEC)
+            "codec","mqtt_ping_bytes","coap_ping_bytes",
+            # trajni red telemetrije (spool.py): dubina posle ciklusa i isprazneno u ciklusu
+            "spool_depth","spool_drain_n","spool_drain_bytes"]
+LOG_STR_COLS = {"proto": 8, "reason": 16, "privacy": 12, "codec": 8}
+CODEC = os.getenv("PAYLOAD_CODEC", "json")
+
+_mqtt_prober = None
+_coap_prober = None
+_publisher = None
 
 def classify_privacy(snap):
     motion = snap.get("motion", 0) or 0
     lux = snap.get("lux", 100.0) or 100.0
     return "sensitive" if (motion and lux <= LUX_PRIVACY_LUX) else "normal"
 
-def measure_mqtt_rtt():
+def measure_mqtt_rtt(timeout=CYCLE_DEADLINE):
+    # perzistentna sesija; vraca sazetak batch-a pingova (p50/p95/loss)
+    global _mqtt_prober
     try:
-        out = subprocess.check_output(["python3", "mqtt_client.py"], timeout=8).decode("utf-8").strip()
-        js = json.loads(out.splitlines()[-1])
-        return js.get("rtt_ms")
+        if _mqtt_prober is None:
+            import mqtt_client
+            _mqtt_prober = mqtt_client.MqttProber()
+        return _mqtt_prober.probe(timeout=timeout)
     except Exception:
         return None
 
-def measure_coap_rtt():
+async def measure_coap_rtt(timeout=CYCLE_DEADLINE):
+    # jedan aiocoap kontekst (i DTLS sesija) za ceo zivot kontrolera
+    global _coap_prober
     try:
-        out = subprocess.check_output(["python3", "coap_client.py"], timeout=8).decode("utf-8").strip()
-        js = json.loads(out.splitlines()[-1])
-        return js.get("rtt_ms")
+        if _coap_prober is None:
+            import coap_client
+            _coap_prober = coap_client.CoapProber()
+        return await _coap_prober.probe(timeout=timeout)
     except Exception:
         return None
 
+async def gather_inputs(sampler, pending, deadline, metrics):
+    # Senzor, MQTT i CoAP proba rade konkurentno pod jednim rokom. Sta ne stigne
+    # do roka ostaje u `pending` i ne pokrece se ponovo dok se ne zavrsi.
+    loop = asyncio.get_running_loop()
+    if "sense" not in pending:
+        pending["sense"] = loop.run_in_executor(None, metrics.timed("sense", sampler.read))
+    if "mqtt" not in pending:
+        pending["mqtt"] = loop.run_in_executor(None, metrics.timed("mqtt", measure_mqtt_rtt), deadline)
+    if "coap" not in pending:
+        pending["coap"] = asyncio.ensure_future(metrics.timed_async("coap", measure_coap_rtt(deadline)))
+    await asyncio.wait(list(pending.values()), timeout=deadline + 0.05)
+    out = {}
+    for name, fut in list(pending.items()):
+        if fut.done():
+            del pending[name]
+            out[name] = fut.result() if not fut.cancelled() and fut.exception() is None else None
+    return out
+
 def choose_policy(snap, rtt_mqtt, rtt_coap):
     privacy = classify_privacy(snap)
     net_rtt = min([v for v in [rtt_mqtt, rtt_coap] if v is not None], default=None)
@@ -60,31 +111,122 @@ def choose_policy(snap, rtt_mqtt, rtt_coap):
 
     return {"proto": proto, "secure": secure, "qos": qos, "interval": interval, "reason": reason, "privacy": privacy}
 
-def send_payload(policy, snap):
-    return True
+async def send_payload(policy, snap, timeout=CYCLE_DEADLINE):
+    # snapshot ide preko protokola/QoS-a iz politike (perzistentne veze, vidi telemetry.py)
+    global _publisher
+    try:
+        if _publisher is None:
+            import telemetry
+            _publisher = telemetry.Publisher(spool=open_spool())
+        return await _publisher.send(policy, snap, timeout)
+    except Exception:
+        return {"ok": 0}
+
+def open_spool():
+    # spool je opcion (SPOOL_DB); ako se baza ne moze otvoriti, telemetrija ide bez njega
+    import spool
+    if not spool.DB:
+        return None
+    try:
+        return spool.Spool()
+    except Exception as e:
+        print(f"spool: {spool.DB}: {e}; nastavljam bez reda")
+        return None
 
-def ensure_log_header():
-    if not LOG.exists():
-        with LOG.open("w", newline="", encoding="utf-8") as f:
-            w = csv.writer(f)
-            w.writerow(["ts","proto","secure","qos","interval","reason","privacy",
-                        "mqtt_rtt_ms","coap_rtt_ms","temperature","humidity","lux","motion"])
+async def drain_spool(policy, timeout=CYCLE_DEADLINE):
+    # backlog iz spool-a kada link to dozvoljava (token bucket u telemetry.Publisher)
+    try:
+        return await _publisher.drain(policy, timeout) if _publisher is not None else None
+    except Exception:
+        return None
 
-def main_loop():
-    ensure_log_header()
+async def run_cycles():
+    log = CsvLog(LOG, LOG_COLS)
+    bin_log = None
+    if EXP_BIN:
+        from log_store import ColumnarLog
+        bin_log = ColumnarLog(LOG.with_suffix(".bin"), LOG_COLS, LOG_STR_COLS)
+    sampler = sensor_daemon.open_sampler()  # sensor_daemon ako radi, inace lokalno
+    metrics = metrics_mod.from_env("controller")
+    loop = asyncio.get_running_loop()
+    pending = {}
+    snap = {}
+    interval = INTERVAL_BASE
+    next_t = loop.time()
+    t_prev = drift = None
+    spool_dropped = 0
     while True:
-        snap = json.loads(subprocess.check_output(["python3", "sensors.py"]).decode("utf-8"))
-        rtt_mqtt = measure_mqtt_rtt()
-        rtt_coap = measure_coap_rtt()
-        pol = choose_policy(snap, rtt_mqtt, rtt_coap)
-        send_payload(pol, snap)
+        t_start = time.perf_counter()
+        if t_prev is not None:
+            drift = (t_start - t_prev - interval) * 1000.0
+            metrics.gauge("drift_seconds", drift / 1000.0)
+        t_prev = t_start
+        res = await gather_inputs(sampler, pending, min(CYCLE_DEADLINE, interval), metrics)
+        t_sense, t_mqtt, t_coap = (metrics.last_ms(k) if k in res else None for k in ("sense", "mqtt", "coap"))
+        fresh = bool(res.get("sense"))  # senzor nije stigao do roka -> isti snapshot se ne salje ponovo
+        snap = res.get("sense") or snap
+        mq = res.get("mqtt") or {}
+        rtt_mqtt = mq.get("p50_ms")
+        cp = res.get("coap") or {}
+        rtt_coap = cp.get("p50_ms")
+        with metrics.stage("policy"):
+            pol = choose_policy(snap, rtt_mqtt, rtt_coap)
+        # slanje dobija samo ostatak ciklusa (do sledeceg zakazanog starta), da ne ugrozi kadencu
+        slot_end = next_t + pol["interval"] - CYCLE_RESERVE
+        with metrics.stage("send"):
+            budget = slot_end - loop.time()
+            pub = (await send_payload(pol, snap, budget) or {}) if fresh and budget > 0 else {}
+        if pub:
+            metrics.inc("published_total", pub.get("n") or 0)
+            metrics.inc("publish_failed_total", 1 - pub["ok"])
+            metrics.inc("wire_bytes_total", pub.get("wire_bytes") or 0)
+        with metrics.stage("drain"):
+            budget = slot_end - loop.time()
+            drained = (await drain_spool(pol, budget) or {}) if budget > 0 else {}
+        sp = getattr(_publisher, "spool", None)
+        if sp is not None:
+            metrics.inc("spool_drained_total", drained.get("n", 0))
+            metrics.inc("spool_drain_wire_bytes_total", drained.get("wire_bytes", 0))
+            metrics.inc("spool_dropped_total", sp.dropped - spool_dropped)
+            spool_dropped = sp.dropped
+            metrics.gauge("spool_depth", sp.depth)
+            metrics.gauge("spool_oldest_age_seconds", sp.oldest_age_s())
+            if drained.get("ms"):
+                metrics.gauge("spool_drain_bytes_per_second", drained["wire_bytes"] * 1000.0 / drained["ms"])
         row = [datetime.utcnow().isoformat()+"Z", pol["proto"], int(pol["secure"]),
                pol["qos"], pol["interval"], pol["reason"], pol.get("privacy",""),
                rtt_mqtt, rtt_coap, snap.get("temperature"), snap.get("humidity"), 
-               snap.get("lux"), snap.get("motion")]
-        with LOG.open("a", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(row)
-        time.sleep(pol["interval"])
+               snap.get("lux"), snap.get("motion"), t_sense,
+               mq.get("p95_ms"), mq.get("loss_pct"), cp.get("p95_ms"), cp.get("loss_pct")]
+        ms = mq.get("setup") or {}
+        cs = cp.get("setup") or {}
+        row += [ms.get("dns_ms"), ms.get("tcp_ms"), ms.get("tls_ms"), ms.get("connack_ms"), ms.get("suback_ms"),
+                ms.get("tls_resumed"), (mq.get("tls") or {}).get("resumed") if ms else None,
+                cs.get("dns_ms"), cs.get("ctx_ms"), cs.get("first_ms")]
+        row += [t_mqtt, t_coap, metrics.last_ms("policy"), metrics.last_ms("send"),
+                metrics.last_ms("log"), metrics.last_ms("cycle"), round(drift, 3) if drift is not None else None,
+                pub.get("n"), pub.get("payload_bytes"), pub.get("wire_bytes"), pub.get("pub_ms"), pub.get("ok"),
+                CODEC, mq.get("payload_bytes"), cp.get("payload_bytes"),
+                sp.depth if sp is not None else None, drained.get("n"), drained.get("wire_bytes")]
+        with metrics.stage("log"):
+            log.write(row)
+            if bin_log is not None:
+                bin_log.write(row)
+        metrics.observe("cycle", time.perf_counter() - t_start)
+        metrics.inc("cycles_total")
+        metrics.gauge("interval_seconds", pol["interval"])
+        metrics.export()
+        # fiksna kadenca: ciklusi pocinju na svakih `interval` s, bez drift-a za trajanje proba
+        interval = pol["interval"]
+        next_t += interval
+        now = loop.time()
+        if next_t < now:
+            next_t = now
+        await asyncio.sleep(next_t - now)
+
+def main_loop():
+    exit_on_sigterm()
+    asyncio.run(run_cycles())
 
 if __name__ == "__main__":
     main_loop()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# echo_server.py - lokalni echo za merenja bez spoljne infrastrukture:
+#   CoAP  POST /echo (aiocoap, opciono DTLS PSK) vraca isti payload,
+#   MQTT  relay iot/edge/ping[/<d>] -> iot/edge/echo[/<d>] preko brokera (opciono TLS),
+#   CoAP  POST /telemetry (telemetry.py) prima i odbacuje payload, 2.04 bez tela.
+# Model mreze: kasnjenje ECHO_DELAY_MS + U(0, ECHO_JITTER_MS), gubitak ECHO_LOSS (0..1).
+# Sopstveno vreme obrade (bez vestackog kasnjenja) se vraca klijentu: MQTT v5 user
+# property proc_us/delay_us, CoAP opcija PROC_US_OPT (uint, us); periodicno se
+# ispisuje JSON statistika (poruke/s, gubici, p50/p95 obrade).
+
+import os, sys, json, time, heapq, random, asyncio, argparse, threading
+from datetime import datetime
+from rtt_stats import LogHistogram
+
+TOPIC_PUB = os.getenv("MQTT_TOPIC_PUB", "iot/edge/ping")
+TOPIC_ECHO = os.getenv("MQTT_TOPIC_ECHO", "iot/edge/echo")
+DELAY_MS = float(os.getenv("ECHO_DELAY_MS", "0"))
+JITTER_MS = float(os.getenv("ECHO_JITTER_MS", "0"))
+LOSS = float(os.getenv("ECHO_LOSS", "0"))
+HOLD_S = float(os.getenv("ECHO_HOLD_S", "30"))  # CoAP "gubitak": odgovor tek posle isteka klijenta
+STATS_S = float(os.getenv("ECHO_STATS_S", "10"))
+COAP_BIND = os.getenv("COAP_BIND", "localhost")
+COAP_DTLS = os.getenv("COAP_DTLS", "0") == "1"
+PSK_ID = os.getenv("COAP_PSK_ID", "")
+PSK = os.getenv("COAP_PSK", "")
+PROC_US_OPT = 65000  # eksperimentalni opseg; paran broj = elektivna, safe-to-forward
+
+class NetModel:
+    def __init__(self, delay_ms=DELAY_MS, jitter_ms=JITTER_MS, loss=LOSS, seed=None):
+        self.delay_ms, self.jitter_ms, self.loss = delay_ms, jitter_ms, loss
+        self.rnd = random.Random(seed)
+
+    def drop(self):
+        return self.loss > 0 and self.rnd.random() < self.loss
+
+    def delay_s(self):
+        return (self.delay_ms + (self.rnd.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)) / 1000.0
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.t0 = time.perf_counter()
+        self.cur = {}
+
+    def add(self, proto, proc_us, dropped=False):
+        with self.lock:
+            c = self.cur.setdefault(proto, {"echoed": 0, "dropped": 0, "proc_us": LogHistogram()})
+            if dropped:
+                c["dropped"] += 1
+            else:
+                c["echoed"] += 1
+                c["proc_us"].add(proc_us)
+
+    def take(self):
+        with self.lock:
+            cur, self.cur = self.cur, {}
+            t, self.t0 = self.t0, time.perf_counter()
+        span = max(1e-9, self.t0 - t)
+        out = {"ts": datetime.utcnow().isoformat()+"Z", "span_s": round(span, 3)}
+        for proto, c in cur.items():
+            h = c["proc_us"]
+            out[proto] = {"echo_per_s": round(c["echoed"] / span, 1), "dropped": c["dropped"],
+                          "proc_p50_us": h.percentile(50), "proc_p95_us": h.percentile(95), "proc_max_us": h.max}
+        return out
+
+class Delayer:
+    # jedan thread sa heap-om rokova: odlozena slanja ne blokiraju paho callback
+    def __init__(self):
+        self.heap = []
+        self.cond = threading.Condition()
+        self.seq = 0
+        threading.Thread(target=self._run, name="echo-delay", daemon=True).start()
+
+    def at(self, t, fn):
+        with self.cond:
+            self.seq += 1
+            heapq.heappush(self.heap, (t, self.seq, fn))
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.heap or self.heap[0][0] > time.perf_counter():
+                    self.cond.wait(self.heap[0][0] - time.perf_counter() if self.heap else None)
+                _, _, fn = heapq.heappop(self.heap)
+            fn()
+
+class MqttRelay:
+    def __init__(self, host, port, tls, model, stats, qos=None):
+        import paho.mqtt.client as mqtt
+        from paho.mqtt.properties import Properties
+        from paho.mqtt.packettypes import PacketTypes
+        self._props = lambda: Properties(PacketTypes.PUBLISH)
+        self.host, self.port, self.model, self.stats, self.qos = host, port, model, stats, qos
+        self.delayer = Delayer()
+        self.client = mqtt.Client(client_id=f"echo-relay-{os.getpid()}", protocol=mqtt.MQTTv5)
+        if tls:
+            import mqtt_client
+            self.client.tls_set_context(mqtt_client.tls_context(host))
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        q = 1 if self.qos is None else self.qos
+        # "ping/#" pokriva i sam "ping"; dve pretplate bi brokeru dale dve kopije poruke
+        client.subscribe(TOPIC_PUB + "/#", qos=q)
+
+    def on_message(self, client, userdata, msg):
+        t0 = time.perf_counter()
+        if self.model.drop():
+            self.stats.add("mqtt", 0, dropped=True)
+            return
+        topic = TOPIC_ECHO + msg.topic[len(TOPIC_PUB):]
+        qos = msg.qos if self.qos is None else self.qos
+        delay = self.model.delay_s()
+
+        def send():
+            t1 = time.perf_counter()
+            proc_us = ((t1 - t0) - delay) * 1e6  # obrada bez vestackog kasnjenja
+            props = self._props()
+            props.UserProperty = [("proc_us", f"{proc_us:.0f}"), ("delay_us", f"{delay * 1e6:.0f}")]
+            ct = getattr(msg.properties, "ContentType", None)  # codec.py: format se prenosi
+            if ct:
+                props.ContentType = ct
+            client.publish(topic, msg.payload, qos=qos, properties=props)
+            self.stats.add("mqtt", proc_us + (time.perf_counter() - t1) * 1e6)
+
+        if delay > 0:
+            self.delayer.at(t0 + delay, send)
+        else:
+            send()
+
+    def start(self):
+        self.client.connect(self.host, self.port, keepalive=60)
+        self.client.loop_start()
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+def echo_resource(model, stats):
+    import aiocoap, aiocoap.resource as resource
+    from aiocoap.optiontypes import UintOption
+    from aiocoap.numbers.optionnumbers import OptionNumber
+
+    class Echo(resource.Resource):
+        async def render_post(self, request):
+            t0 = time.perf_counter()
+            dropped = model.drop()
+            delay = HOLD_S if dropped else model.delay_s()
+            if dropped:
+                # aiocoap ne moze da odbaci CON; odgovor se zadrzava dok klijent ne odustane
+                stats.add("coap", 0, dropped=True)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            resp = aiocoap.Message(code=aiocoap.CHANGED, payload=request.payload,
+                                   content_format=request.opt.content_format)
+            if dropped:
+                return resp
+            proc_us = (time.perf_counter() - t0 - delay) * 1e6
+            resp.opt.add_option(UintOption(OptionNumber(PROC_US_OPT), max(0, int(proc_us))))
+            stats.add("coap", proc_us)
+            return resp
+
+    return Echo()
+
+def sink_resource(model, stats):
+    import aiocoap, aiocoap.resource as resource
+
+    class Sink(resource.Resource):
+        async def render_post(self, request):
+            t0 = time.perf_counter()
+            if model.drop():
+                stats.add("telemetry", 0, dropped=True)
+                await asyncio.sleep(HOLD_S)
+                return aiocoap.Message(code=aiocoap.CHANGED)
+            delay = model.delay_s()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            stats.add("telemetry", (time.perf_counter() - t0 - delay) * 1e6)
+            return aiocoap.Message(code=aiocoap.CHANGED)
+
+    return Sink()
+
+async def serve(mqtt=True, coap=True, host=None, port=None, tls=None, model=None, stats_s=STATS_S, out=sys.stdout):
+    model = model or NetModel()
+    stats = Stats()
+    tls = (os.getenv("MQTT_TLS", "1") == "1") if tls is None else tls
+    host = host or os.getenv("MQTT_HOST", "localhost")
+    port = port or int(os.getenv("MQTT_PORT", "8883" if tls else "1883"))
+    relay = ctx = None
+    if mqtt:
+        relay = MqttRelay(host, port, tls, model, stats)
+        try:
+            relay.start()
+        except Exception as e:
+            print(f"echo: MQTT relay disabled ({host}:{port}): {e}", file=sys.stderr)
+            relay = None
+    if coap:
+        import aiocoap, aiocoap.resource as resource
+        site = resource.Site()
+        site.add_resource(["echo"], echo_resource(model, stats))
+        site.add_resource(["telemetry"], sink_resource(model, stats))
+        creds = None
+        if COAP_DTLS:
+            from aiocoap.credentials import CredentialsMap
+            creds = CredentialsMap()
+            creds.load_from_dict({":client": {"dtls": {"psk": PSK.encode("utf-8"),
+                                                        "client-identity": PSK_ID.encode("utf-8")}}})
+        kw = {"server_credentials": creds} if creds is not None else {}
+        ctx = await aiocoap.Context.create_server_context(site, bind=(COAP_BIND, None), **kw)
+    try:
+        while True:
+            await asyncio.sleep(stats_s)
+            if out is not None:
+                print(json.dumps(stats.take()), file=out, flush=True)
+    finally:
+        if relay is not None:
+            relay.close()
+        if ctx is not None:
+            await ctx.shutdown()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="CoAP /echo + MQTT ping->echo relay")
+    ap.add_argument("--no-mqtt", action="store_true")
+    ap.add_argument("--no-coap", action="store_true")
+    ap.add_argument("--delay-ms", type=float, default=DELAY_MS)
+    ap.add_argument("--jitter-ms", type=float, default=JITTER_MS)
+    ap.add_argument("--loss", type=float, default=LOSS)
+    ap.add_argument("--seed", type=int, default=None)
+    a = ap.parse_args(argv)
+    from log_writer import exit_on_sigterm
+    exit_on_sigterm()
+    try:
+        asyncio.run(serve(not a.no_mqtt, not a.no_coap, model=NetModel(a.delay_ms, a.jitter_ms, a.loss, a.seed)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# loadgen.py - N virtuelnih edge uredjaja (MQTT ping + CoAP echo) rasporedjenih na
+# procese; svaki proces vrti asyncio petlju sa po jednim task-om po uredjaju.
+# Uredjaj <d> salje na iot/edge/ping/<d> i ocekuje echo na iot/edge/echo/<d>.
+# Na svakih --report s ispisuje se zbirni protok, loss/greske i p50/p95/p99
+# (LogHistogram-i iz procesa se spajaju), a na kraju JSON sazetak.
+#
+# Primer (lokalni mosquitto + ugradjeni echo stand-in):
+#   python3 loadgen.py --devices 200 --procs 4 --mqtt-rate 1 --coap-rate 1 --standin
+
+import os, sys, json, time, uuid, random, asyncio, argparse, threading
+import multiprocessing as mp
+from datetime import datetime
+from rtt_stats import LogHistogram
+
+TOPIC_PUB = os.getenv("MQTT_TOPIC_PUB", "iot/edge/ping")
+TOPIC_ECHO = os.getenv("MQTT_TOPIC_ECHO", "iot/edge/echo")
+PROTOS = ("mqtt", "coap")
+
+class Stats:
+    # brojaci i RTT histogram po protokolu za tekuci interval izvestaja (thread-safe,
+    # paho callback-ovi dolaze iz network thread-ova)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.cur = {p: {"sent": 0, "recv": 0, "lost": 0, "errors": 0, "hist": LogHistogram()} for p in PROTOS}
+
+    def add(self, proto, key, n=1):
+        with self.lock:
+            self.cur[proto][key] += n
+
+    def rtt(self, proto, ms):
+        with self.lock:
+            self.cur[proto]["recv"] += 1
+            self.cur[proto]["hist"].add(ms)
+
+    def take(self):
+        with self.lock:
+            out = {p: {**{k: v for k, v in c.items() if k != "hist"}, "hist": c["hist"].to_dict()}
+                   for p, c in self.cur.items()}
+            self.reset()
+        return out
+
+class MqttDevice:
+    def __init__(self, dev, stats, a, tls_ctx):
+        import paho.mqtt.client as mqtt
+        self.dev, self.stats, self.a = dev, stats, a
+        self.pending = {}
+        self.ready = threading.Event()
+        self.client = mqtt.Client(client_id=f"lg-{dev}-{uuid.uuid4().hex[:6]}", protocol=mqtt.MQTTv5)
+        if tls_ctx is not None:
+            self.client.tls_set_context(tls_ctx)
+        self.client.on_connect = lambda c, u, f, rc, p=None: c.subscribe(f"{TOPIC_ECHO}/{dev}", qos=a.qos)
+        self.client.on_subscribe = lambda *args: self.ready.set()
+        self.client.on_message = self.on_message
+
+    def on_message(self, client, userdata, msg):
+        try:
+            corr = json.loads(msg.payload)["corr"]
+        except Exception:
+            return
+        t0 = self.pending.pop(corr, None)
+        if t0 is not None:
+            self.stats.rtt("mqtt", (time.perf_counter() - t0) * 1000.0)
+
+    def start(self):
+        self.client.connect(self.a.host, self.a.port, keepalive=60)
+        self.client.loop_start()
+
+    def ping(self):
+        corr = uuid.uuid4().hex[:16]
+        self.pending[corr] = time.perf_counter()
+        r = self.client.publish(f"{TOPIC_PUB}/{self.dev}", json.dumps({"corr": corr, "dev": self.dev}), qos=self.a.qos)
+        self.stats.add("mqtt", "sent")
+        if getattr(r, "rc", 0):
+            self.pending.pop(corr, None)
+            self.stats.add("mqtt", "errors")
+
+    def expire(self, timeout):
+        now = time.perf_counter()
+        old = [c for c, t in list(self.pending.items()) if now - t > timeout]
+        for c in old:
+            if self.pending.pop(c, None) is not None:
+                self.stats.add("mqtt", "lost")
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+async def mqtt_device(d, a, t_end):
+    if not await asyncio.get_running_loop().run_in_executor(None, d.ready.wait, a.timeout):
+        d.stats.add("mqtt", "errors")
+        return
+    t = a.t0 + random.random() / a.mqtt_rate  # zajednicki start, razmaknuti uredjaji
+    await asyncio.sleep(max(0.0, t - time.perf_counter()))
+    while t < t_end:
+        d.ping()
+        d.expire(a.timeout)
+        t += 1.0 / a.mqtt_rate
+        await asyncio.sleep(max(0.0, t - time.perf_counter()))
+
+async def coap_device(dev, ctx, url, stats, a, t_end):
+    import aiocoap
+    t = a.t0 + random.random() / a.coap_rate
+    await asyncio.sleep(max(0.0, t - time.perf_counter()))
+    inflight = set()
+
+    async def one():
+        req = aiocoap.Message(code=aiocoap.POST, mtype=aiocoap.CON, uri=url,
+                              payload=json.dumps({"corr": uuid.uuid4().hex[:16], "dev": dev}).encode("utf-8"))
+        t0 = time.perf_counter()
+        stats.add("coap", "sent")
+        try:
+            resp = await asyncio.wait_for(ctx.request(req).response, a.timeout)
+        except asyncio.TimeoutError:
+            stats.add("coap", "lost")
+            return
+        except Exception:
+            stats.add("coap", "errors")
+            return
+        if resp.code.is_successful():
+            stats.rtt("coap", (time.perf_counter() - t0) * 1000.0)
+        else:
+            stats.add("coap", "errors")
+
+    while t < t_end:
+        task = asyncio.ensure_future(one())
+        inflight.add(task)
+        task.add_done_callback(inflight.discard)
+        t += 1.0 / a.coap_rate
+        await asyncio.sleep(max(0.0, t - time.perf_counter()))
+    if inflight:
+        await asyncio.wait(inflight, timeout=a.timeout)
+
+async def run_worker(wid, devs, a, q):
+    stats = Stats()
+    t_start = a.t0
+    t_end = t_start + a.duration
+    tasks, mqtt_devs, ctx = [], [], None
+    if a.mqtt_rate > 0:
+        tls_ctx = None
+        if a.tls:
+            import mqtt_client
+            tls_ctx = mqtt_client.tls_context(a.host)
+        for dev in devs:
+            d = MqttDevice(dev, stats, a, tls_ctx)
+            try:
+                d.start()
+            except Exception:
+                stats.add("mqtt", "errors")
+                continue
+            mqtt_devs.append(d)
+            tasks.append(asyncio.ensure_future(mqtt_device(d, a, t_end)))
+    if a.coap_rate > 0:
+        import aiocoap
+        ctx = await aiocoap.Context.create_client_context()
+        tasks += [asyncio.ensure_future(coap_device(dev, ctx, a.coap_url, stats, a, t_end)) for dev in devs]
+    k = 1
+    while True:
+        t_rep = t_start + k * a.report
+        await asyncio.sleep(max(0.0, t_rep - time.perf_counter()))
+        done = t_rep >= t_end + a.timeout
+        if done:
+            for d in mqtt_devs:
+                d.expire(0.0)
+        q.put((wid, k, stats.take()))
+        if done:
+            break
+        k += 1
+    for t in tasks:
+        t.cancel()
+    for d in mqtt_devs:
+        d.close()
+    if ctx is not None:
+        await ctx.shutdown()
+
+def worker(wid, devs, a, q):
+    try:
+        asyncio.run(run_worker(wid, devs, a, q))
+    finally:
+        q.put((wid, None, None))
+
+def merge(parts):
+    out = {}
+    for p in PROTOS:
+        h = LogHistogram()
+        tot = {"sent": 0, "recv": 0, "lost": 0, "errors": 0}
+        for part in parts:
+            for key in tot:
+                tot[key] += part[p][key]
+            h.merge(LogHistogram.from_dict(part[p]["hist"]))
+        out[p] = {"hist": h, **tot}
+    return out
+
+def line(t, m, span):
+    row = {"t_s": round(t, 1)}
+    for p, c in m.items():
+        if not (c["sent"] or c["recv"] or c["lost"] or c["errors"]):
+            continue
+        h = c["hist"]
+        done = c["recv"] + c["lost"] + c["errors"]
+        row[p] = {"tx_per_s": round(c["sent"] / span, 1), "rx_per_s": round(c["recv"] / span, 1),
+                  "loss_pct": round(100.0 * c["lost"] / done, 2) if done else None,
+                  "err_pct": round(100.0 * c["errors"] / done, 2) if done else None,
+                  "p50_ms": h.percentile(50), "p95_ms": h.percentile(95), "p99_ms": h.percentile(99)}
+    return row
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="MQTT/CoAP load generator")
+    ap.add_argument("--devices", type=int, default=int(os.getenv("LG_DEVICES", "50")))
+    ap.add_argument("--procs", type=int, default=int(os.getenv("LG_PROCS", str(os.cpu_count() or 1))))
+    ap.add_argument("--duration", type=float, default=float(os.getenv("LG_DURATION", "30")))
+    ap.add_argument("--mqtt-rate", type=float, default=float(os.getenv("LG_MQTT_RATE", "1")), help="Hz po uredjaju, 0 = bez MQTT")
+    ap.add_argument("--coap-rate", type=float, default=float(os.getenv("LG_COAP_RATE", "1")), help="Hz po uredjaju, 0 = bez CoAP")
+    ap.add_argument("--qos", type=int, default=int(os.getenv("MQTT_QOS", "0")))
+    ap.add_argument("--tls", action=argparse.BooleanOptionalAction, default=os.getenv("MQTT_TLS", "1") == "1")
+    ap.add_argument("--host", default=os.getenv("MQTT_HOST", "localhost"))
+    ap.add_argument("--port", type=int, default=None)
+    ap.add_argument("--coap-url", default=os.getenv("COAP_URL", "coap://localhost/echo"))
+    ap.add_argument("--timeout", type=float, default=5.0)
+    ap.add_argument("--report", type=float, default=5.0, help="period izvestaja (s)")
+    ap.add_argument("--standin", action="store_true", help="pokreni lokalni echo_server (CoAP /echo + MQTT relay)")
+    ap.add_argument("--out", default="", help="JSON sazetak u fajl")
+    a = ap.parse_args(argv)
+    if a.port is None:
+        a.port = int(os.getenv("MQTT_PORT", "8883" if a.tls else "1883"))
+    standin = None
+    if a.standin:
+        standin = mp.Process(target=run_standin, args=(a,), daemon=True)
+        standin.start()
+        time.sleep(1.0)
+    procs = max(1, min(a.procs, a.devices))
+    devs = [f"dev{i:04d}" for i in range(a.devices)]
+    q = mp.Queue()
+    a.t0 = time.perf_counter() + 0.5 + 0.01 * a.devices / procs  # zajednicki start posle konekcija
+    ws = [mp.Process(target=worker, args=(w, devs[w::procs], a, q)) for w in range(procs)]
+    for w in ws:
+        w.start()
+    intervals, total, alive = {}, [], procs
+    while alive:
+        wid, k, part = q.get()
+        if k is None:
+            alive -= 1
+            continue
+        intervals.setdefault(k, []).append(part)
+        total.append(part)
+        if len(intervals[k]) == procs:
+            print(json.dumps(line(k * a.report, merge(intervals.pop(k)), a.report)), flush=True)
+    for w in ws:
+        w.join()
+    summary = line(a.duration, merge(total), a.duration)
+    summary.update(ts=datetime.utcnow().isoformat()+"Z", devices=a.devices, procs=procs, qos=a.qos, tls=a.tls,
+                   mqtt_rate=a.mqtt_rate, coap_rate=a.coap_rate)
+    print("summary:", json.dumps(summary))
+    if a.out:
+        with open(a.out, "w") as f:
+            json.dump(summary, f, indent=2)
+    if standin is not None:
+        standin.terminate()
+    return 0
+
+def run_standin(a):
+    # lokalni echo (echo_server.py): CoAP /echo + MQTT relay ping/# -> echo/# preko brokera
+    import echo_server
+    asyncio.run(echo_server.serve(a.mqtt_rate > 0, a.coap_rate > 0, a.host, a.port, a.tls, out=None))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# log_store.py - binarni kolonski log (NumPy structured zapisi, append) pored CSV-a
+# i jedan tipizirani loader koji vraca {kolona: np.ndarray} za sve skripte analize.
+#
+# Format: <log>.bin su sirovi zapisi fiksne duzine, <log>.bin.json cuva dtype.descr.
+# Dodavanje reda je jedan write na kraj fajla; ucitavanje je np.fromfile (bez parsiranja).
+# CSV se parsira jednom (pyarrow.csv kada je instaliran), a rezultat se kesira u
+# <log>.npz dok je CSV nepromenjen (EXP_CACHE=0 iskljucuje kes).
+
+import os, csv, json, atexit, itertools
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+
+FLUSH_ROWS = int(os.getenv("LOG_FLUSH_ROWS", "50"))
+CACHE = os.getenv("EXP_CACHE", "1") == "1"
+EXP_DATA = os.getenv("EXP_DATA", "exp_log.csv")  # exp_log.csv ili exp_log.bin za analizu
+
+def make_dtype(columns, str_cols):
+    # ts -> epoch sekunde (f8), tekstualne kolone -> S<n>, ostalo -> f8 (NaN = prazno)
+    return np.dtype([(c, "f8") if c not in str_cols else (c, f"S{str_cols[c]}") for c in columns])
+
+def _epoch(ts):
+    if isinstance(ts, str):
+        return datetime.fromisoformat(ts.rstrip("Z")).replace(tzinfo=timezone.utc).timestamp()
+    return float(ts)
+
+class ColumnarLog:
+    def __init__(self, path, columns, str_cols, flush_rows=FLUSH_ROWS):
+        self.path = Path(path)
+        self.dtype = make_dtype(columns, str_cols)
+        self.flush_rows = max(1, flush_rows)
+        self.buf = []
+        schema = self.path.with_name(self.path.name + ".json")
+        descr = json.dumps(self.dtype.descr)
+        if schema.exists() and schema.read_text() != descr:
+            stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+            for p in (self.path, schema):
+                if p.exists():
+                    os.replace(p, p.with_name(p.name + f".old-{stamp}"))
+        schema.write_text(descr)
+        self.f = self.path.open("ab")
+        atexit.register(self.close)
+
+    def _conv(self, name, v):
+        if name == "ts":
+            return _epoch(v)
+        if self.dtype[name].kind == "S":
+            return "" if v is None else str(v).encode("utf-8")
+        return np.nan if v is None or v == "" else float(v)
+
+    def write(self, row):
+        self.buf.append(tuple(self._conv(n, v) for n, v in zip(self.dtype.names, row)))
+        if len(self.buf) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if self.buf and self.f is not None:
+            self.f.write(np.array(self.buf, dtype=self.dtype).tobytes())
+            self.f.flush()
+            self.buf = []
+
+    def close(self):
+        self.flush()
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+def _narrow(a):
+    # tipovi kao kod pandas.read_csv: bool, int (ako nema praznih), float, inace str
+    if a.dtype.kind == "f":
+        if len(a) and not np.isnan(a).any() and np.all(a == np.round(a)) and np.all(np.abs(a) < 2**53):
+            return a.astype(np.int64)
+        return a
+    if a.dtype.kind in "SO":
+        a = np.array(["" if v is None else (v.decode("utf-8") if isinstance(v, bytes) else str(v)) for v in a])
+    if a.dtype.kind == "U":
+        u = set(np.unique(a).tolist())
+        if u and u <= {"True", "False"}:
+            return a == "True"
+        try:
+            f = np.where(a == "", "nan", a).astype(np.float64)
+        except ValueError:
+            return a
+        return _narrow(f)
+    return a
+
+def _ts_epoch(a):
+    if a.dtype.kind == "M":
+        return a.astype("datetime64[us]").astype(np.int64) / 1e6
+    if a.dtype.kind == "U":
+        try:
+            return np.char.rstrip(a, "Z").astype("datetime64[us]").astype(np.int64) / 1e6
+        except ValueError:
+            return a
+    return a
+
+def _read_csv(path):
+    try:
+        import pyarrow.csv as pacsv
+    except ImportError:
+        pacsv = None
+    if pacsv is not None:
+        tbl = pacsv.read_csv(str(path))
+        out = {}
+        for name in tbl.column_names:
+            out[name] = tbl.column(name).to_numpy(zero_copy_only=False)
+        return out
+    with open(path, newline="", encoding="utf-8") as fh:
+        rd = csv.reader(fh)
+        header = next(rd, [])
+        return _columns(header, list(rd))
+
+def _columns(header, rows):
+    n = len(header)
+    rows = [r if len(r) == n else (r + [""] * n)[:n] for r in rows]
+    cols = list(zip(*rows)) or [()] * n
+    return {h: np.array(c, dtype=str) for h, c in zip(header, cols)}
+
+def _bin_dtype(path):
+    schema = path.with_name(path.name + ".json")
+    return np.dtype([tuple(d) for d in json.loads(schema.read_text())])
+
+def _read_bin(path):
+    path = Path(path)
+    dt = _bin_dtype(path)
+    arr = np.fromfile(path, dtype=dt)
+    return {name: arr[name] for name in dt.names}
+
+def iter_chunks(path=EXP_DATA, chunk_rows=100000):
+    # jedan prolaz kroz log u blokovima od chunk_rows redova; memorija ne zavisi od
+    # velicine loga (tipovi se odredjuju po bloku, pa koristiti num()/text())
+    path = Path(path)
+    if path.suffix == ".bin":
+        dt = _bin_dtype(path)
+        n = path.stat().st_size // dt.itemsize
+        if not n:
+            return
+        arr = np.memmap(path, dtype=dt, mode="r", shape=(n,))
+        for i in range(0, n, chunk_rows):
+            blk = np.array(arr[i:i + chunk_rows])
+            yield {k: blk[k] if k == "ts" else _narrow(blk[k]) for k in dt.names}
+        return
+    with open(path, newline="", encoding="utf-8") as fh:
+        rd = csv.reader(fh)
+        header = next(rd, [])
+        while True:
+            rows = list(itertools.islice(rd, chunk_rows))
+            if not rows:
+                return
+            yield {k: _narrow(v) for k, v in _columns(header, rows).items()}
+
+def load_columns(path=EXP_DATA, columns=None):
+    # vraca dict kolona; prazna polja su NaN (float) odnosno "" (str), ts je epoch (s)
+    path = Path(path)
+    if path.suffix == ".bin":
+        raw = _read_bin(path)
+        cols = {k: _narrow(v) if k != "ts" else v for k, v in raw.items()}
+    else:
+        cache = path.with_name(path.name + ".npz")
+        if CACHE and cache.exists() and cache.stat().st_mtime > path.stat().st_mtime:
+            with np.load(cache, allow_pickle=False) as z:
+                cols = {k: z[k] for k in z.files}
+        else:
+            raw = _read_csv(path)
+            cols = {k: _narrow(v) for k, v in raw.items()}
+            if "ts" in cols:
+                cols["ts"] = _ts_epoch(cols["ts"])
+            if CACHE:
+                try:
+                    with open(cache, "wb") as fh:
+                        np.savez(fh, **cols)
+                except OSError:
+                    pass
+    if columns is not None:
+        cols = {k: cols[k] for k in columns if k in cols}
+    return cols
+
+def num(cols, name, default=np.nan):
+    # kolona kao float niz (NaN za prazno/nepostojece)
+    n = len(next(iter(cols.values()))) if cols else 0
+    if name not in cols:
+        return np.full(n, default, dtype=np.float64)
+    a = cols[name]
+    if a.dtype.kind in "fiub":
+        return a.astype(np.float64)
+    return np.where(a == "", "nan", a).astype(np.float64)
+
+def text(cols, name):
+    n = len(next(iter(cols.values()))) if cols else 0
+    if name not in cols:
+        return np.full(n, "", dtype="U1")
+    a = cols[name]
+    if a.dtype.kind == "f":
+        whole = np.nan_to_num(a).astype(np.int64).astype(str)
+        return np.where(np.isnan(a), "", np.where(a == np.round(a), whole, a.astype(str)))
+    return a.astype(str)
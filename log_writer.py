@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# log_writer.py - baferovani CSV log: fajl ostaje otvoren, redovi se upisuju u
+# batch-evima iz pozadinskog thread-a (flush po broju redova / vremenu, opcioni
+# fsync), upis i rotacija se serijalizuju izmedju procesa preko flock(<log>.lock).
+
+import os, io, csv, sys, time, fcntl, queue, atexit, signal, threading
+from datetime import datetime
+from pathlib import Path
+
+FLUSH_ROWS = int(os.getenv("LOG_FLUSH_ROWS", "50"))
+FLUSH_S = float(os.getenv("LOG_FLUSH_S", "5"))
+FSYNC = os.getenv("LOG_FSYNC", "0") == "1"
+ROTATE_MB = float(os.getenv("LOG_ROTATE_MB", "0"))  # 0 = bez rotacije po velicini
+ROTATE_S = float(os.getenv("LOG_ROTATE_S", "0"))    # 0 = bez rotacije po vremenu
+
+_STOP = object()
+
+def exit_on_sigterm():
+    # `timeout` iz run_final_experiment*.sh salje SIGTERM; bez ovoga atexit ne
+    # radi i baferovani redovi se gube
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+class CsvLog:
+    def __init__(self, path, header, flush_rows=FLUSH_ROWS, flush_s=FLUSH_S, fsync=FSYNC,
+                 rotate_bytes=ROTATE_MB * 1e6, rotate_s=ROTATE_S):
+        self.path = Path(path)
+        self.header = list(header)
+        self.flush_rows = max(1, flush_rows)
+        self.flush_s = flush_s
+        self.fsync = fsync
+        self.rotate_bytes = rotate_bytes
+        self.rotate_s = rotate_s
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.f = None
+        self.period = None
+        self.q = queue.Queue()
+        with self._locked():
+            self._open()
+        self.thread = threading.Thread(target=self._run, name=f"log:{self.path.name}", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, row):
+        self.q.put(list(row))
+
+    def flush(self, timeout=None):
+        ev = threading.Event()
+        self.q.put(ev)
+        return ev.wait(timeout)
+
+    def close(self, timeout=5.0):
+        if self.thread.is_alive():
+            self.q.put(_STOP)
+            self.thread.join(timeout)
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def _locked(self):
+        lock = open(self.lock_path, "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock  # zatvaranje fajla otpusta flock
+
+    def _open(self):
+        # poziva se pod lock-om; stari fajl sa drugacijim zaglavljem se sklanja
+        if self.path.exists() and self.path.stat().st_size > 0:
+            with self.path.open(newline="", encoding="utf-8") as fh:
+                first = next(csv.reader(fh), [])
+            if first != self.header:
+                self._rotate_aside("old")
+        self.f = self.path.open("a", newline="", encoding="utf-8")
+        if self.f.tell() == 0:
+            self.f.write(self._render([self.header]))
+            self.f.flush()
+        self.period = self._period()
+
+    def _period(self):
+        return int(time.time() // self.rotate_s) if self.rotate_s else 0
+
+    def _rotate_aside(self, tag):
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        dst = self.path.with_name(f"{self.path.stem}.{tag}-{stamp}{self.path.suffix}")
+        n = 1
+        while dst.exists():
+            dst = self.path.with_name(f"{self.path.stem}.{tag}-{stamp}-{n}{self.path.suffix}")
+            n += 1
+        os.replace(self.path, dst)
+
+    def _reopen_if_rotated(self):
+        # drugi proces je mozda rotirao fajl: nas fd tada pokazuje na stari inode
+        try:
+            same = os.path.samestat(os.fstat(self.f.fileno()), os.stat(self.path))
+        except FileNotFoundError:
+            same = False
+        if not same:
+            self.f.close()
+            self._open()
+
+    def _maybe_rotate(self):
+        size = os.fstat(self.f.fileno()).st_size
+        if (self.rotate_bytes and size >= self.rotate_bytes) or \
+           (self.rotate_s and self._period() != self.period):
+            self.f.close()
+            self._rotate_aside("rot")
+            self._open()
+
+    @staticmethod
+    def _render(rows):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        return buf.getvalue()
+
+    def _flush(self, rows):
+        if not rows:
+            return True
+        data = self._render(rows)
+        try:
+            with self._locked():
+                self._reopen_if_rotated()
+                self._maybe_rotate()
+                self.f.write(data)
+                self.f.flush()
+                if self.fsync:
+                    os.fsync(self.f.fileno())
+            return True
+        except OSError as e:
+            print("Log write error:", e)
+            return False
+
+    def _run(self):
+        buf = []
+        t_first = None
+        while True:
+            timeout = None if not buf else max(0.0, self.flush_s - (time.monotonic() - t_first))
+            try:
+                item = self.q.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(buf)
+                return
+            if isinstance(item, threading.Event):
+                if self._flush(buf):
+                    buf = []
+                item.set()
+                continue
+            if item is not None:
+                if not buf:
+                    t_first = time.monotonic()
+                buf.append(item)
+            if buf and (len(buf) >= self.flush_rows or time.monotonic() - t_first >= self.flush_s):
+                if self._flush(buf):
+                    buf = []
+                else:
+                    t_first = time.monotonic()  # redovi ostaju u baferu za sledeci pokusaj
@@ -1,81 +1,118 @@
 #!/usr/bin/env python3
 # make_tables.py - pravi sazetke tabela iz exp_log.csv i actuator_log.csv
+import os
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from log_store import EXP_DATA, iter_chunks, load_columns, num, text
 
-EXP = Path("exp_log.csv")
+EXP = Path(EXP_DATA)
 ACT = Path("actuator_log.csv")
 
-def pct(xs, p):
-    xs = np.sort(xs)
-    if len(xs) == 0:
-        return np.nan
-    k = (len(xs) - 1) * p / 100.0
-    f = int(k)
-    c = min(f + 1, len(xs) - 1)
-    if f == c:
-        return xs[f]
-    return xs[f] + (xs[c] - xs[f]) * (k - f)
+GROUPS = ["MQTT_Q0", "MQTT_Q1", "CoAPS"]
+DTYPES = {"run": str, "proto": str, "mqtt_qos": str, "ok": str, "lat_s": "float64"}
+CHUNK_ROWS = int(os.getenv("TABLE_CHUNK_ROWS", "200000"))
 
-def agg_tbl(sub):
-    if len(sub) == 0:
+class Partial:
+    # delimican agregat jedne (run, group) celije; spaja se preko blokova i run-ova.
+    # Latencije se cuvaju kao float64 nizovi (8 B po redu), pa su p50/p95 tacni
+    # (linearna interpolacija, kao np.median/pct ranije); cena je memorija O(N) u broju
+    # redova sa lat_s (~8 MB na milion redova), ostale kolone se ne zadrzavaju.
+    def __init__(self):
+        self.count = 0
+        self.ok = 0
+        self.lat = []
+
+    def merge(self, other):
+        self.count += other.count
+        self.ok += other.ok
+        self.lat += other.lat
+        return self
+
+def agg_tbl(part, has_ok=True):
+    if part.count == 0:
         return pd.Series(dict(count=0, ok_pct=np.nan, p50=np.nan, p95=np.nan, mean=np.nan))
-    l = sub["lat_s"].dropna().values
+    l = np.concatenate(part.lat) if part.lat else np.empty(0)
     return pd.Series(
         dict(
-            count=len(sub),
-            ok_pct=100 * sub["ok"].mean() if "ok" in sub else np.nan,
-            p50=np.median(l) if len(l) else np.nan,
-            p95=pct(l, 95) if len(l) else np.nan,
+            count=part.count,
+            ok_pct=100 * part.ok / part.count if has_ok else np.nan,
+            p50=np.percentile(l, 50) if len(l) else np.nan,
+            p95=np.percentile(l, 95) if len(l) else np.nan,
             mean=np.mean(l) if len(l) else np.nan,
         )
     )
 
+def iter_frames(path):
+    # blokovi sa eksplicitnim tipovima; radna memorija citanja zavisi od CHUNK_ROWS
+    # (latencije koje Partial zadrzava rastu sa logom, vidi Partial)
+    if path.suffix == ".bin":
+        for cols in iter_chunks(path, CHUNK_ROWS):
+            yield pd.DataFrame({"run": text(cols, "run"), "proto": text(cols, "proto"),
+                                "mqtt_qos": text(cols, "mqtt_qos"), "ok": text(cols, "ok"),
+                                "lat_s": num(cols, "lat_s")}).replace({"run": {"": np.nan}})
+        return
+    yield from pd.read_csv(path, dtype=DTYPES, usecols=lambda c: c in DTYPES, chunksize=CHUNK_ROWS)
+
+def run_key(r):
+    try:
+        return (0, float(r), "")
+    except ValueError:
+        return (1, 0.0, r)
+
+def exp_partials(path):
+    parts = {}
+    has_ok = True
+    for df in iter_frames(path):
+        for c in DTYPES:
+            if c not in df.columns:
+                df[c] = np.nan
+        has_ok = has_ok and df["ok"].notna().any()
+        # normalize types (qos "0"/"0.0"/"" -> 0/NaN)
+        qos = pd.to_numeric(df["mqtt_qos"], errors="coerce")
+        mqtt = df["proto"].eq("mqtt_tls")
+        df["group"] = np.select([mqtt & qos.eq(0), mqtt & qos.eq(1), df["proto"].eq("coap_dtls")], GROUPS, "")
+        df["ok"] = df["ok"].astype(str).eq("True")
+        df = df[df["group"] != ""]
+        for (run, group), sub in df.groupby(["run", "group"], dropna=False, sort=False):
+            p = Partial()
+            p.count = len(sub)
+            p.ok = int(sub["ok"].sum())
+            lat = sub["lat_s"].to_numpy(dtype=np.float64)
+            p.lat.append(lat[~np.isnan(lat)])
+            key = (None if pd.isna(run) else run, group)
+            parts[key] = parts[key].merge(p) if key in parts else p
+    return parts, has_ok
+
 def exp_tables():
     if not EXP.exists():
         print("No exp_log.csv found.")
         return
-    df = pd.read_csv(EXP)
-    # normalize types
-    df["ok"] = df["ok"].astype(str).eq("True")
-    for c in ["lat_s"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-    if "mqtt_qos" in df.columns:
-        df["mqtt_qos"] = df["mqtt_qos"].astype(str)
-    else:
-        df["mqtt_qos"] = "NA"
+    parts, has_ok = exp_partials(EXP)
 
     # Table 1: RUN * {MQTT_Q0, MQTT_Q1, CoAPS}
     rows = []
-    runs = sorted(df["run"].dropna().unique().tolist())
+    runs = sorted({run for run, _ in parts if run is not None}, key=run_key)
     for run in runs:
-        combos = [
-            ("MQTT_Q0", (df["run"].eq(run) & df["proto"].eq("mqtt_tls") & df["mqtt_qos"].eq("0"))),
-            ("MQTT_Q1", (df["run"].eq(run) & df["proto"].eq("mqtt_tls") & df["mqtt_qos"].eq("1"))),
-            ("CoAPS",   (df["run"].eq(run) & df["proto"].eq("coap_dtls"))),
-        ]
-        for name, mask in combos:
-            sub = df[mask]
-            s = agg_tbl(sub)
+        for name in sorted(GROUPS):
+            s = agg_tbl(parts.get((run, name), Partial()), has_ok)
             s["run"] = run
             s["group"] = name
             rows.append(s)
-    tbl1 = pd.DataFrame(rows)[["run", "group", "count", "ok_pct", "p50", "p95", "mean"]].sort_values(["run", "group"])
+    tbl1 = pd.DataFrame(rows, columns=["run", "group", "count", "ok_pct", "p50", "p95", "mean"])
     tbl1.to_csv("table_run_proto.csv", index=False)
     tbl1_md = tbl1.copy()
     tbl1_md.columns = ["RUN", "Group", "Count", "OK (%)", "p50 (s)", "p95 (s)", "Mean (s)"]
     tbl1_md.to_markdown("table_run_proto.md", index=False)
 
-    # Table 2: Globalno po protokolu/QoS
+    # Table 2: Globalno po protokolu/QoS (spajanje parcijala svih run-ova)
     rows = []
-    for name, mask in [
-        ("MQTT_Q0", (df["proto"].eq("mqtt_tls") & df["mqtt_qos"].eq("0"))),
-        ("MQTT_Q1", (df["proto"].eq("mqtt_tls") & df["mqtt_qos"].eq("1"))),
-        ("CoAPS",   (df["proto"].eq("coap_dtls"))),
-    ]:
-        sub = df[mask]
-        s = agg_tbl(sub)
+    for name in GROUPS:
+        total = Partial()
+        for (run, group), p in parts.items():
+            if group == name:
+                total.merge(p)
+        s = agg_tbl(total, has_ok)
         s["group"] = name
         rows.append(s)
     tbl2 = pd.DataFrame(rows)[["group", "count", "ok_pct", "p50", "p95", "mean"]]
@@ -90,7 +127,7 @@ def act_tables():
     if not ACT.exists():
         print("Actuator table skipped (no actuator_log.csv).")
         return
-    da = pd.read_csv(ACT)
+    da = pd.DataFrame(load_columns(ACT))
     if "reason" in da.columns:
         share = da["reason"].value_counts(normalize=True) * 100.0
         share = share.rename("percent").to_frame()
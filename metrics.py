@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# metrics.py - jeftini tajmeri faza (perf_counter + LogHistogram po fazi), brojaci i
+# gauge-ovi, izvoz u Prometheus tekst formatu:
+#   METRICS_FILE=/var/lib/node_exporter/textfile/iot.prom  (atomski upis, textfile collector)
+#   METRICS_PORT=9108                                      (HTTP /metrics, pozadinski thread)
+# PROFILE_HZ>0 ukljucuje sampling profiler (sys._current_frames) koji u PROFILE_OUT
+# pise collapsed stack-ove (flamegraph.pl / speedscope).
+
+import os, sys, time, atexit, threading
+from collections import Counter
+from contextlib import contextmanager
+from rtt_stats import LogHistogram
+
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+PROFILE_HZ = float(os.getenv("PROFILE_HZ", "0"))
+PROFILE_OUT = os.getenv("PROFILE_OUT", "profile.folded")
+QUANTILES = (0.5, 0.95, 0.99)
+
+class Metrics:
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.hist = {}      # faza -> LogHistogram (s)
+        self.last = {}      # faza -> poslednje trajanje (ms)
+        self.gauges = {}
+        self.counters = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            h = self.hist.get(stage)
+            if h is None:
+                h = self.hist[stage] = LogHistogram()
+            h.add(seconds)
+            self.last[stage] = seconds * 1000.0
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def timed(self, name, fn):
+        def run(*args, **kw):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kw)
+            finally:
+                self.observe(name, time.perf_counter() - t0)
+        return run
+
+    async def timed_async(self, name, aw):
+        t0 = time.perf_counter()
+        try:
+            return await aw
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def inc(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def last_ms(self, stage):
+        v = self.last.get(stage)
+        return round(v, 3) if v is not None else None
+
+    def prometheus(self):
+        p = self.prefix
+        out = [f"# TYPE {p}_stage_seconds summary"]
+        with self.lock:
+            for stage, h in sorted(self.hist.items()):
+                for q in QUANTILES:
+                    out.append(f'{p}_stage_seconds{{stage="{stage}",quantile="{q}"}} {h.quantile(q):.6g}')
+                out.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {h.sum:.6g}')
+                out.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+            for name, v in sorted(self.counters.items()):
+                out += [f"# TYPE {p}_{name} counter", f"{p}_{name} {v}"]
+            for name, v in sorted(self.gauges.items()):
+                if v is not None:
+                    out += [f"# TYPE {p}_{name} gauge", f"{p}_{name} {v:.6g}"]
+        return "\n".join(out) + "\n"
+
+    def write_textfile(self, path=METRICS_FILE):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+    def serve_http(self, port=METRICS_PORT, addr="127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        srv = ThreadingHTTPServer((addr, port), Handler)
+        threading.Thread(target=srv.serve_forever, name="metrics-http", daemon=True).start()
+        return srv
+
+    def export(self):
+        # poziva se jednom po ciklusu; textfile samo kada je METRICS_FILE zadat
+        if METRICS_FILE:
+            try:
+                self.write_textfile(METRICS_FILE)
+            except OSError:
+                pass
+
+class Profiler:
+    # Sampling profiler: na hz uzoraka/s belezi stack svakog thread-a (osim sopstvenog);
+    # rezultat je "thread;f1;f2;... broj" po liniji. Trosak je ~1 uzorak po periodu,
+    # nezavisno od hot path-a.
+    def __init__(self, hz=PROFILE_HZ, out=PROFILE_OUT, depth=48):
+        self.period = 1.0 / hz
+        self.out = out
+        self.depth = depth
+        self.stacks = Counter()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self.stop.wait(self.period):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.depth:
+                    co = frame.f_code
+                    stack.append(f"{co.co_name} ({os.path.basename(co.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join([names.get(ident, str(ident))] + stack[::-1])] += 1
+
+    def close(self):
+        self.stop.set()
+        self.thread.join(1.0)
+        with open(self.out, "w") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+def from_env(prefix):
+    m = Metrics(prefix)
+    if METRICS_PORT:
+        m.serve_http(METRICS_PORT)
+    if PROFILE_HZ > 0:
+        m.profiler = Profiler()
+    return m
@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 # mqtt_client.py - MQTT(TLS) klijent sa merenjem RTT poruke.
+# Ping payload je u formatu PAYLOAD_CODEC (codec.py), ContentType u MQTT v5 property-ju.
 
-import os, ssl, time, json, uuid
+import os, ssl, time, json, uuid, socket, threading
+from collections import deque
 from datetime import datetime
 import paho.mqtt.client as mqtt
+from rtt_stats import summarize
+import codec as codec_mod
 
 BROKER = os.getenv("MQTT_HOST", "localhost")
 PORT = int(os.getenv("MQTT_PORT", "8883"))
@@ -17,51 +21,285 @@ CERT = os.getenv("MQTT_CERT", "")
 KEY = os.getenv("MQTT_KEY", "")
 QOS = int(os.getenv("MQTT_QOS", "0"))
 TIMEOUT = float(os.getenv("MQTT_TIMEOUT", "5"))
+PINGS = int(os.getenv("MQTT_PINGS", "3"))
+WINDOW = int(os.getenv("MQTT_RTT_WINDOW", "100"))
+BURST = int(os.getenv("MQTT_BURST", "0"))         # main: N pingova po QoS-u (0 = jedan ping)
+RATE = float(os.getenv("MQTT_RATE", "20"))        # main: pingova u sekundi u burst-u
+BURST_QOS = [int(q) for q in os.getenv("MQTT_BURST_QOS", "0,1").split(",") if q.strip()]
+SETUPS = int(os.getenv("MQTT_SETUPS", "0"))      # main: N novih konekcija, faze po konekciji
+# echo pretplata na najvisem QoS-u koji se meri: broker isporucuje min(QoS objave, QoS pretplate)
+SUB_QOS = max([QOS] + BURST_QOS)
 
 rtt_store = {}
+codec = codec_mod.get()
 
 def on_connect(client, userdata, flags, rc, properties=None):
-    client.subscribe(TOPIC_ECHO, qos=QOS)
+    client.subscribe(TOPIC_ECHO, qos=SUB_QOS)
 
 def on_message(client, userdata, msg):
     try:
-        data = json.loads(msg.payload.decode("utf-8"))
+        data = codec_mod.decode_mqtt(msg)
     except Exception:
         return
     corr = data.get("corr")
     t0 = rtt_store.pop(corr, None)
     if t0 is not None:
         rtt = (time.perf_counter() - t0) * 1000.0
+        if userdata is not None:
+            userdata.record(corr, rtt)
+            return
         print(json.dumps({"ts": datetime.utcnow().isoformat()+"Z",
                           "proto": "MQTT",
                           "qos": QOS,
                           "rtt_ms": rtt,
                           "corr": corr}, ensure_ascii=False))
 
-def build_client():
+class TimedSSLSocket(ssl.SSLSocket):
+    def do_handshake(self, block=False):
+        t0 = time.perf_counter()
+        super().do_handshake(block)
+        ctx = self.context
+        ctx.hs_ms = (time.perf_counter() - t0) * 1000.0
+        ctx.resumed_last = self.session_reused
+        ctx.handshakes += 1
+        ctx.resumed += int(self.session_reused)
+
+class TimedTLSContext(ssl.SSLContext):
+    # SSLContext koji meri TLS handshake i nudi poslednju sesiju pri svakoj novoj
+    # konekciji (resumption). wrap_socket se poziva odmah posle TCP connect-a, pa
+    # t_wrap zatvara TCP fazu. hostname (po instanci, tls_context(hostname)) je ime
+    # za SNI/proveru sertifikata kada se paho povezuje na vec razresenu IP adresu;
+    # None = host koji je prosledjen paho connect()-u.
+    sslsocket_class = TimedSSLSocket
+    hostname = None
+    session = t_wrap = hs_ms = resumed_last = None
+    handshakes = resumed = 0
+
+    def wrap_socket(self, sock, server_hostname=None, session=None, **kw):
+        self.t_wrap = time.perf_counter()
+        return super().wrap_socket(sock, server_hostname=self.hostname or server_hostname,
+                                   session=session or self.session, **kw)
+
+def tls_context(hostname=None):
+    ctx = TimedTLSContext(ssl.PROTOCOL_TLS_CLIENT)
+    ctx.hostname = hostname
+    if CA:
+        ctx.load_verify_locations(cafile=CA)
+    else:
+        ctx.load_default_certs()
+    if CERT and KEY:
+        ctx.load_cert_chain(certfile=CERT, keyfile=KEY)
+    return ctx
+
+def resolve(host, port):
+    # DNS faza posebno; paho se zatim povezuje na adresu, bez ponovnog razresavanja
+    t0 = time.perf_counter()
+    addr = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0][4][0]
+    return addr, (time.perf_counter() - t0) * 1000.0
+
+def build_client(ctx=None):
     client = mqtt.Client(client_id=CLIENT_ID, protocol=mqtt.MQTTv5)
     client.on_connect = on_connect
     client.on_message = on_message
     if TLS:
-        ctx = ssl.create_default_context(cafile=CA if CA else None)
-        if CERT and KEY:
-            ctx.load_cert_chain(certfile=CERT, keyfile=KEY)
-        client.tls_set_context(ctx)
+        client.tls_set_context(ctx or tls_context())
     return client
 
+class MqttProber:
+    # Jedna (TLS) sesija ostaje otvorena izmedju ciklusa kontrolera; pingovi se
+    # salju pipelined sa corr ID-jem preko rtt_store, a RTT-ovi idu u klizni prozor.
+    # Uspostavljanje veze se meri po fazama (setup): dns, tcp, tls, connack, suback.
+    def __init__(self, qos=QOS, pings=PINGS, window=WINDOW):
+        self.qos = qos
+        self.pings = pings
+        self.window = deque(maxlen=window)
+        self.client = None
+        # deli se izmedju konekcija (TLS sesija); connect ide na razresenu IP, pa SNI = BROKER
+        self.tls = tls_context(BROKER) if TLS else None
+        self.ready = threading.Event()
+        self.cond = threading.Condition()
+        self.batch = {}
+        self.pending = set()   # corr-ovi za koje collect() jos ceka echo
+        self.setup = None      # faze poslednjeg uspostavljanja veze
+        self.props = codec.mqtt_properties()
+        self.payload_bytes = None  # velicina poslednjeg kodiranog ping-a
+        self._reported = True  # setup vec vracen iz probe()
+        self._t = {}
+
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
+        t = time.perf_counter()
+        if self.setup is not None and "connect" in self._t:
+            self.setup["connack_ms"] = (t - self._t.pop("connect")) * 1000.0
+        if self.tls is not None:
+            try:
+                self.tls.session = client.socket().session  # za resumption pri sledecoj vezi
+            except Exception:
+                pass
+        self._t["subscribe"] = t
+        on_connect(client, userdata, flags, rc, properties)
+
+    def _on_subscribe(self, client, userdata, *args):
+        if self.setup is not None and "subscribe" in self._t:
+            self.setup["suback_ms"] = (time.perf_counter() - self._t.pop("subscribe")) * 1000.0
+        self.ready.set()
+
+    def _on_disconnect(self, client, userdata, *args):
+        self.ready.clear()
+
+    def start(self, timeout=TIMEOUT):
+        if self.client is None:
+            addr, dns_ms = resolve(BROKER, PORT)
+            client = build_client(self.tls)
+            client.user_data_set(self)
+            client.on_connect = self._on_connect
+            client.on_subscribe = self._on_subscribe
+            client.on_disconnect = self._on_disconnect
+            self.setup = {"dns_ms": dns_ms, "tcp_ms": None, "tls_ms": None, "tls_resumed": None,
+                          "connack_ms": None, "suback_ms": None}
+            self._reported = False
+            t0 = time.perf_counter()
+            client.connect(addr, PORT, keepalive=30)  # TCP + TLS handshake + CONNECT
+            t1 = time.perf_counter()
+            self._t["connect"] = t1
+            if self.tls is not None and self.tls.t_wrap is not None:
+                self.setup.update(tcp_ms=(self.tls.t_wrap - t0) * 1000.0, tls_ms=self.tls.hs_ms,
+                                  tls_resumed=int(bool(self.tls.resumed_last)))
+            else:
+                self.setup["tcp_ms"] = (t1 - t0) * 1000.0
+            client.loop_start()
+            self.client = client
+        return self.ready.wait(timeout)
+
+    def take_setup(self):
+        # faze nove veze tacno jednom (u ciklusu u kom je veza uspostavljena)
+        if self._reported or self.setup is None or not self.ready.is_set():
+            return None
+        self._reported = True
+        return dict(self.setup)
+
+    def tls_stats(self):
+        if self.tls is None:
+            return {"handshakes": 0, "resumed": 0}
+        return {"handshakes": self.tls.handshakes, "resumed": self.tls.resumed}
+
+    def record(self, corr, rtt):
+        with self.cond:
+            if corr not in self.pending:
+                return  # echo stigao posle isteka collect()
+            self.batch[corr] = rtt
+            self.window.append(rtt)
+            self.cond.notify_all()
+
+    def send(self, n, qos=None, rate=None):
+        # n pingova; sa rate (Hz) ravnomerno rasporedjeni, inace pipelined
+        qos = self.qos if qos is None else qos
+        corrs = []
+        t = time.perf_counter()
+        for i in range(n):
+            if rate and i:
+                t += 1.0 / rate
+                time.sleep(max(0.0, t - time.perf_counter()))
+            corr = codec.new_corr()
+            data = codec.encode({"ts": datetime.utcnow().isoformat()+"Z", "corr": corr, "ping": 1})
+            self.payload_bytes = len(data)
+            with self.cond:
+                self.pending.add(corr)
+            rtt_store[corr] = time.perf_counter()
+            self.client.publish(TOPIC_PUB, data, qos=qos, properties=self.props)
+            corrs.append(corr)
+        return corrs
+
+    def collect(self, corrs, timeout=TIMEOUT):
+        # ceka echo za sve corrs (signal iz on_message); vraca RTT po corr, None = izgubljen
+        with self.cond:
+            self.cond.wait_for(lambda: all(c in self.batch for c in corrs), timeout=max(0.0, timeout))
+            got = {c: self.batch.pop(c, None) for c in corrs}
+            self.pending.difference_update(corrs)
+        for c in corrs:
+            rtt_store.pop(c, None)  # kasni echo se odbacuje
+        return got
+
+    def probe(self, n=None, timeout=TIMEOUT):
+        n = self.pings if n is None else n
+        t_end = time.perf_counter() + timeout
+        if not self.start(timeout):
+            return summarize([], n)
+        got = self.collect(self.send(n), t_end - time.perf_counter())
+        out = summarize([v for v in got.values() if v is not None], n)
+        out["rolling"] = self.distribution()
+        out["setup"] = self.take_setup()
+        out["tls"] = self.tls_stats()
+        out["codec"] = codec.name
+        out["payload_bytes"] = self.payload_bytes
+        return out
+
+    def distribution(self):
+        with self.cond:
+            return summarize(list(self.window))
+
+    def close(self):
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+            self.client = None
+            self.ready.clear()
+
+def burst(prober, n=BURST, rate=RATE, qos_list=BURST_QOS, timeout=TIMEOUT):
+    # jedan burst po QoS-u preko iste veze; sazetak + svi uzorci (redom slanja)
+    out = {"ts": datetime.utcnow().isoformat()+"Z", "proto": "MQTT", "burst": n, "rate_hz": rate,
+           "setup": prober.take_setup()}
+    for q in qos_list:
+        t0 = time.perf_counter()
+        got = prober.collect(prober.send(n, q, rate), timeout)
+        samples = [got[c] for c in got]
+        res = summarize([v for v in samples if v is not None], n)
+        res["duration_s"] = time.perf_counter() - t0
+        res["samples_ms"] = samples
+        out[f"qos{q}"] = res
+    out["codec"] = codec.name
+    out["payload_bytes"] = prober.payload_bytes
+    return out
+
+def setups(n=SETUPS, timeout=TIMEOUT):
+    # n uzastopnih novih konekcija sa istim TLS kontekstom: faze po konekciji i
+    # koliko handshake-ova je nastavilo prethodnu TLS sesiju
+    p = MqttProber()
+    runs = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        ok = p.start(timeout)
+        setup = p.take_setup() or dict(p.setup or {})
+        if ok:
+            got = p.collect(p.send(1), timeout)
+            setup["rtt_ms"] = next(iter(got.values()))
+        setup["total_ms"] = (time.perf_counter() - t0) * 1000.0
+        runs.append(setup)
+        p.close()
+    return {"ts": datetime.utcnow().isoformat()+"Z", "proto": "MQTT", "setups": runs, "tls": p.tls_stats()}
+
 def main():
-    client = build_client()
-    client.connect(BROKER, PORT, keepalive=30)
-    client.loop_start()
-    corr = uuid.uuid4().hex
-    payload = {"ts": datetime.utcnow().isoformat()+"Z", "corr": corr, "ping": 1}
-    rtt_store[corr] = time.perf_counter()
-    client.publish(TOPIC_PUB, json.dumps(payload), qos=QOS)
-    t_end = time.time() + TIMEOUT
-    while time.time() < t_end and corr in rtt_store:
-        time.sleep(0.01)
-    client.loop_stop()
-    client.disconnect()
+    if SETUPS > 0:
+        print(json.dumps(setups(), ensure_ascii=False))
+        return
+    p = MqttProber()
+    if not p.start(TIMEOUT):
+        print(json.dumps({"ts": datetime.utcnow().isoformat()+"Z", "proto": "MQTT", "error": "connect timeout"}))
+        p.close()
+        return
+    if BURST > 0:
+        print(json.dumps(burst(p), ensure_ascii=False))
+    else:
+        got = p.collect(p.send(1), TIMEOUT)
+        for corr, rtt in got.items():
+            if rtt is not None:
+                print(json.dumps({"ts": datetime.utcnow().isoformat()+"Z",
+                                  "proto": "MQTT",
+                                  "qos": QOS,
+                                  "rtt_ms": rtt,
+                                  "corr": corr,
+                                  "codec": codec.name,
+                                  "payload_bytes": p.payload_bytes}, ensure_ascii=False))
+    p.close()
 
 if __name__ == "__main__":
     main()
@@ -2,40 +2,53 @@
 # -*- coding: utf-8 -*-
 # plot_actuator.py - grafici za servo.
 
-import csv
+import os, sys
 import matplotlib.pyplot as plt
-from collections import Counter
 import numpy as np
-
-def read_rows(path="actuator_log.csv"):
-    with open(path, newline="", encoding="utf-8") as fh:
-        return list(csv.DictReader(fh))
-
-rows = read_rows()
-angles = [int(r["angle"]) for r in rows if r.get("angle")]
-lux = [float(r["lux"]) for r in rows if r.get("lux")]
-reasons = [r["reason"] for r in rows]
-
-plt.figure()
-plt.plot(angles); plt.ylabel("angle (deg)"); plt.title("Servo angle time-series"); plt.tight_layout(); plt.savefig("act_ts_angle.png", dpi=120)
-
-plt.figure()
-lx = [float(r["lux"]) for r in rows if r.get("lux")]
-an = [int(r["angle"]) for r in rows if r.get("lux")]
-plt.scatter(lx, an); plt.xlabel("lux"); plt.ylabel("angle"); plt.title("Angle vs Lux"); plt.tight_layout(); plt.savefig("act_angle_vs_lux.png", dpi=120)
-
-plt.figure()
-plt.hist(angles, bins=18); plt.xlabel("angle"); plt.ylabel("count"); plt.title("Angle histogram"); plt.tight_layout(); plt.savefig("act_hist_angle.png", dpi=120)
-
-rs = sorted(set(reasons))
-vals = []
-for rr in rs:
-    ang = [int(r["angle"]) for r in rows if r["reason"]==rr and r.get("angle")]
-    vals.append([sum(ang)/len(ang) if ang else 0])
-arr = np.array(vals)
-plt.figure()
-plt.imshow(arr, aspect="auto"); plt.yticks(range(len(rs)), rs); plt.xticks([0], ["avg angle"]); plt.colorbar(label="deg"); plt.title("Reason → avg angle"); plt.tight_layout(); plt.savefig("act_heat_reason_angle.png", dpi=120)
-
-cnt = Counter(reasons)
-plt.figure()
-plt.bar(list(cnt.keys()), list(cnt.values())); plt.xticks(rotation=45, ha="right"); plt.title("Reason share"); plt.tight_layout(); plt.savefig("act_reason_share.png", dpi=120)
+from log_store import load_columns, num, text
+from render import Figures
+
+ACT = os.getenv("ACT_LOG", "actuator_log.csv")
+figs = Figures()
+
+def load_data(path=ACT):
+    cols = load_columns(path)
+    angle = num(cols, "angle")
+    lux = num(cols, "lux")
+    reason = text(cols, "reason")
+    # odbacene/zamenjene komande (bridge) imaju prazan act_ms: ugao nije primenjen;
+    # stari logovi bez kolone act_ms se racunaju kao primenjeni
+    applied = ~np.isnan(num(cols, "act_ms", 0.0))
+    has_angle = ~np.isnan(angle) & applied
+    has_lux = ~np.isnan(lux) & applied
+    rs, codes = np.unique(reason, return_inverse=True)
+    # prosecan ugao po razlogu: bincount po kodu razloga
+    n = np.bincount(codes[has_angle], minlength=len(rs))
+    tot = np.bincount(codes[has_angle], weights=angle[has_angle], minlength=len(rs))
+    return {"angles": angle[has_angle].astype(int), "lux": lux[has_lux], "lux_angle": angle[has_lux],
+            "reasons": rs.tolist(), "reason_count": np.bincount(codes, minlength=len(rs)),
+            "reason_avg_angle": np.where(n > 0, tot / np.maximum(n, 1), 0)}
+
+@figs.add("act_ts_angle.png")
+def ts_angle(D):
+    plt.plot(D["angles"]); plt.ylabel("angle (deg)"); plt.title("Servo angle time-series")
+
+@figs.add("act_angle_vs_lux.png")
+def angle_vs_lux(D):
+    plt.scatter(D["lux"], D["lux_angle"]); plt.xlabel("lux"); plt.ylabel("angle"); plt.title("Angle vs Lux")
+
+@figs.add("act_hist_angle.png")
+def hist_angle(D):
+    plt.hist(D["angles"], bins=18); plt.xlabel("angle"); plt.ylabel("count"); plt.title("Angle histogram")
+
+@figs.add("act_heat_reason_angle.png")
+def heat_reason_angle(D):
+    rs = D["reasons"]
+    plt.imshow(D["reason_avg_angle"].reshape(-1, 1), aspect="auto"); plt.yticks(range(len(rs)), rs); plt.xticks([0], ["avg angle"]); plt.colorbar(label="deg"); plt.title("Reason → avg angle")
+
+@figs.add("act_reason_share.png")
+def reason_share(D):
+    plt.bar(D["reasons"], D["reason_count"]); plt.xticks(rotation=45, ha="right"); plt.title("Reason share")
+
+if __name__ == "__main__":
+    sys.exit(figs.main(load_data, ACT, "plot_actuator"))
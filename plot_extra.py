@@ -1,160 +1,147 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 # plot_extra.py - 15 dodatnih grafika iz exp_log.csv
+# Log se parsira jednom u kompaktne kolone (float32 RTT, proto/reason kao kategorijski
+# kodovi); grupne statistike (heatmap p50/p95) dolaze iz jednog sortiranja po grupi.
+# Figure se crtaju paralelno preko render.py (vidi --help).
 
-import csv, statistics
-from collections import defaultdict, Counter
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
+from log_store import EXP_DATA, load_columns, num, text
+from render import Figures
+
+PROTOS = ["MQTT", "CoAP"]
+figs = Figures()
+
+def load_data(path=EXP_DATA):
+    cols = load_columns(path)
+    proto = text(cols, "proto")
+    reasons, reason_code = np.unique(text(cols, "reason"), return_inverse=True)
+    # proto kod: 0=MQTT, 1=CoAP, -1=ostalo; rtt je RTT protokola tog reda
+    proto_code = np.select([proto == p for p in PROTOS], range(len(PROTOS)), -1).astype(np.int8)
+    rtt = np.where(proto_code == 0, num(cols, "mqtt_rtt_ms"),
+                   np.where(proto_code == 1, num(cols, "coap_rtt_ms"), np.nan)).astype(np.float32)
+    D = {"proto": proto_code, "reason": reason_code.astype(np.int16), "reasons": reasons.tolist(),
+         "rtt": rtt, "lux": num(cols, "lux").astype(np.float32),
+         "humidity": num(cols, "humidity").astype(np.float32),
+         "qos": np.nan_to_num(num(cols, "qos")).astype(np.int8)}
+    valid = ~np.isnan(rtt)
+    D["by_proto"] = {p: np.sort(rtt[valid & (proto_code == i)]) for i, p in enumerate(PROTOS)}
+    D["p50"], D["p95"] = group_quantiles(D, [0.5, 0.95])
+    return D
+
+def group_quantiles(D, qs):
+    # jedan lexsort po (grupa, rtt) za sve (proto, reason) celije; rang k = round(q*(n-1))
+    nr = len(D["reasons"])
+    ok = ~np.isnan(D["rtt"]) & (D["proto"] >= 0)
+    g = D["proto"][ok].astype(np.int64) * nr + D["reason"][ok]
+    v = D["rtt"][ok]
+    order = np.lexsort((v, g))
+    g, v = g[order], v[order]
+    counts = np.bincount(g, minlength=len(PROTOS) * nr)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    out = []
+    for q in qs:
+        idx = starts + np.round(q * np.maximum(counts - 1, 0)).astype(np.int64)
+        vals = v[np.minimum(idx, len(v) - 1)] if len(v) else np.zeros(len(counts))
+        out.append(np.where(counts > 0, vals, 0).reshape(len(PROTOS), nr))
+    return out
+
+def cdf(s):
+    return s, np.arange(1, len(s) + 1) / max(len(s), 1)
 
-def read_rows(path="exp_log.csv"):
-    with open(path, newline="", encoding="utf-8") as fh:
-        return list(csv.DictReader(fh))
-
-rows = read_rows()
-
-def colflt(row, name):
-    try:
-        return float(row[name]) if row[name] else None
-    except:
-        return None
-
-def collect(proto, name):
-    return [colflt(r, name) for r in rows if r["proto"]==proto and r.get(name)]
-
-def cdf(vals):
-    s = sorted([v for v in vals if v is not None])
-    if not s: return [], []
-    x, y = [], []
-    n = len(s)
-    for i, v in enumerate(s):
-        x.append(v); y.append((i+1)/n)
-    return x, y
-
-def save(name):
-    plt.tight_layout()
-    plt.savefig(name, dpi=120)
-    plt.clf()
-
-# 1 CDF MQTT
-x,y = cdf(collect("MQTT","mqtt_rtt_ms"))
-plt.plot(x,y); plt.xlabel("RTT (ms)"); plt.ylabel("CDF"); plt.title("MQTT CDF")
-save("extra_mqtt_cdf.png")
-
-# 2 CDF CoAP
-x,y = cdf(collect("CoAP","coap_rtt_ms"))
-plt.plot(x,y); plt.xlabel("RTT (ms)"); plt.ylabel("CDF"); plt.title("CoAP CDF")
-save("extra_coap_cdf.png")
-
-# 3 boxplot MQTT vs CoAP
-data = [collect("MQTT","mqtt_rtt_ms"), collect("CoAP","coap_rtt_ms")]
-plt.boxplot([ [v for v in d if v is not None] for d in data ], labels=["MQTT","CoAP"])
-plt.ylabel("RTT (ms)"); plt.title("Boxplot RTT")
-save("extra_boxplot_proto.png")
-
-# 4 OK% (<200ms)
 def ok_rate(vals, thr=200.0):
-    s = [v for v in vals if v is not None]
-    if not s: return 0
-    return 100.0*sum(1 for v in s if v<thr)/len(s)
-mqtt_ok = ok_rate(collect("MQTT","mqtt_rtt_ms"))
-coap_ok = ok_rate(collect("CoAP","coap_rtt_ms"))
-plt.bar(["MQTT","CoAP"], [mqtt_ok, coap_ok]); plt.ylabel("OK%"); plt.title("OK% (<200ms)")
-save("extra_ok_rate.png")
-
-# 5 scatter lux vs mqtt_rtt
-x = [colflt(r,"lux") for r in rows if r["proto"]=="MQTT"]
-y = [colflt(r,"mqtt_rtt_ms") for r in rows if r["proto"]=="MQTT"]
-x = [v for v in x if v is not None]; y = [v for v in y if v is not None]
-plt.scatter(x, y); plt.xlabel("lux"); plt.ylabel("MQTT RTT (ms)"); plt.title("Lux vs MQTT RTT")
-save("extra_scatter_lux_mqtt.png")
-
-# 6 time-series RTT (index vs value)
-rtt = [colflt(r,"mqtt_rtt_ms") if r["proto"]=="MQTT" else colflt(r,"coap_rtt_ms") for r in rows]
-rtt = [v for v in rtt if v is not None]
-plt.plot(rtt); plt.ylabel("RTT (ms)"); plt.title("RTT time-series")
-save("extra_ts_rtt.png")
-
-# 7 heatmap p50 po reason
-reasons = sorted(set(r["reason"] for r in rows))
-protos = ["MQTT","CoAP"]
-grid = []
-for proto in protos:
-    row = []
-    for reason in reasons:
-        vals = [colflt(r,"mqtt_rtt_ms") if proto=="MQTT" else colflt(r,"coap_rtt_ms")
-                for r in rows if r["proto"]==proto and r["reason"]==reason]
-        vs = [v for v in vals if v is not None]
-        p50 = sorted(vs)[int(0.5*(len(vs)-1))] if vs else 0
-        row.append(p50)
-    grid.append(row)
-arr = np.array(grid)
-plt.imshow(arr, aspect="auto")
-plt.xticks(range(len(reasons)), reasons, rotation=45, ha="right"); plt.yticks(range(len(protos)), protos)
-plt.colorbar(label="p50 RTT (ms)"); plt.title("Heatmap p50 po razlogu")
-save("extra_heatmap_p50_reason.png")
-
-# 8 heatmap p95 po reason
-grid95 = []
-for proto in protos:
-    row = []
-    for reason in reasons:
-        vals = [colflt(r,"mqtt_rtt_ms") if proto=="MQTT" else colflt(r,"coap_rtt_ms")
-                for r in rows if r["proto"]==proto and r["reason"]==reason]
-        vs = [v for v in vals if v is not None]
-        p95 = sorted(vs)[int(0.95*(len(vs)-1))] if vs else 0
-        row.append(p95)
-    grid95.append(row)
-arr = np.array(grid95)
-plt.imshow(arr, aspect="auto")
-plt.xticks(range(len(reasons)), reasons, rotation=45, ha="right"); plt.yticks(range(len(protos)), protos)
-plt.colorbar(label="p95 RTT (ms)"); plt.title("Heatmap p95 po razlogu")
-save("extra_heatmap_p95_reason.png")
-
-# 9 histogram MQTT
-vals = [v for v in collect("MQTT","mqtt_rtt_ms") if v is not None]
-plt.hist(vals, bins=30); plt.xlabel("RTT (ms)"); plt.ylabel("count"); plt.title("MQTT histogram")
-save("extra_hist_mqtt.png")
-
-# 10 histogram CoAP
-vals = [v for v in collect("CoAP","coap_rtt_ms") if v is not None]
-plt.hist(vals, bins=30); plt.xlabel("RTT (ms)"); plt.ylabel("count"); plt.title("CoAP histogram")
-save("extra_hist_coap.png")
-
-# 11 bar reason share
-cnt = Counter(r["reason"] for r in rows)
-plt.bar(list(cnt.keys()), list(cnt.values())); plt.xticks(rotation=45, ha="right"); plt.title("Reason share")
-save("extra_reason_share.png")
-
-# 12 violin plot RTT
-vals_m = [v for v in collect("MQTT","mqtt_rtt_ms") if v is not None]
-vals_c = [v for v in collect("CoAP","coap_rtt_ms") if v is not None]
-plt.violinplot([vals_m, vals_c], showmeans=True); plt.xticks([1,2], ["MQTT","CoAP"]); plt.ylabel("RTT (ms)"); plt.title("Violin RTT")
-save("extra_violin.png")
-
-# 13 QQ-plot (requires scipy); fallback to skip if not installed
-try:
-    from scipy import stats
-    vals = [v for v in collect("MQTT","mqtt_rtt_ms") if v is not None]
-    if len(vals)>5:
-        (osm, osr), (slope, intercept, r) = stats.probplot(vals, dist="norm")
-        plt.scatter(osm, osr); plt.title("QQ MQTT"); save("extra_qq_mqtt.png")
-except Exception:
-    pass
-
-# 14 scatter humidity vs coap_rtt
-x = [colflt(r,"humidity") for r in rows if r["proto"]=="CoAP"]
-y = [colflt(r,"coap_rtt_ms") for r in rows if r["proto"]=="CoAP"]
-x = [v for v in x if v is not None]; y = [v for v in y if v is not None]
-plt.scatter(x,y); plt.xlabel("humidity"); plt.ylabel("CoAP RTT (ms)"); plt.title("Humidity vs CoAP RTT")
-save("extra_scatter_hum_coap.png")
-
-# 15 QoS over index
-qos = []
-for r in rows:
+    if not len(vals): return 0
+    return 100.0 * np.count_nonzero(vals < thr) / len(vals)
+
+def paired(D, a, b, proto):
+    x, y = D[a], D[b]
+    m = (D["proto"] == PROTOS.index(proto)) & ~np.isnan(x) & ~np.isnan(y)
+    return x[m], y[m]
+
+def heatmap(D, arr, label, title):
+    plt.imshow(arr, aspect="auto")
+    plt.xticks(range(len(D["reasons"])), D["reasons"], rotation=45, ha="right"); plt.yticks(range(len(PROTOS)), PROTOS)
+    plt.colorbar(label=label); plt.title(title)
+
+@figs.add("extra_mqtt_cdf.png")
+def mqtt_cdf(D):
+    x,y = cdf(D["by_proto"]["MQTT"])
+    plt.plot(x,y); plt.xlabel("RTT (ms)"); plt.ylabel("CDF"); plt.title("MQTT CDF")
+
+@figs.add("extra_coap_cdf.png")
+def coap_cdf(D):
+    x,y = cdf(D["by_proto"]["CoAP"])
+    plt.plot(x,y); plt.xlabel("RTT (ms)"); plt.ylabel("CDF"); plt.title("CoAP CDF")
+
+@figs.add("extra_boxplot_proto.png")
+def boxplot_proto(D):
+    plt.boxplot([D["by_proto"][p] for p in PROTOS]); plt.xticks([1,2], PROTOS)
+    plt.ylabel("RTT (ms)"); plt.title("Boxplot RTT")
+
+@figs.add("extra_ok_rate.png")
+def ok_rate_bar(D):
+    plt.bar(PROTOS, [ok_rate(D["by_proto"][p]) for p in PROTOS]); plt.ylabel("OK%"); plt.title("OK% (<200ms)")
+
+@figs.add("extra_scatter_lux_mqtt.png")
+def scatter_lux_mqtt(D):
+    x,y = paired(D, "lux", "rtt", "MQTT")
+    plt.scatter(x, y); plt.xlabel("lux"); plt.ylabel("MQTT RTT (ms)"); plt.title("Lux vs MQTT RTT")
+
+@figs.add("extra_ts_rtt.png")
+def ts_rtt(D):
+    plt.plot(D["rtt"][~np.isnan(D["rtt"])]); plt.ylabel("RTT (ms)"); plt.title("RTT time-series")
+
+@figs.add("extra_heatmap_p50_reason.png")
+def heatmap_p50(D):
+    heatmap(D, D["p50"], "p50 RTT (ms)", "Heatmap p50 po razlogu")
+
+@figs.add("extra_heatmap_p95_reason.png")
+def heatmap_p95(D):
+    heatmap(D, D["p95"], "p95 RTT (ms)", "Heatmap p95 po razlogu")
+
+@figs.add("extra_hist_mqtt.png")
+def hist_mqtt(D):
+    plt.hist(D["by_proto"]["MQTT"], bins=30); plt.xlabel("RTT (ms)"); plt.ylabel("count"); plt.title("MQTT histogram")
+
+@figs.add("extra_hist_coap.png")
+def hist_coap(D):
+    plt.hist(D["by_proto"]["CoAP"], bins=30); plt.xlabel("RTT (ms)"); plt.ylabel("count"); plt.title("CoAP histogram")
+
+@figs.add("extra_reason_share.png")
+def reason_share(D):
+    cnt = np.bincount(D["reason"], minlength=len(D["reasons"]))
+    plt.bar(D["reasons"], cnt); plt.xticks(rotation=45, ha="right"); plt.title("Reason share")
+
+@figs.add("extra_violin.png")
+def violin(D):
+    mq, co = D["by_proto"]["MQTT"], D["by_proto"]["CoAP"]
+    if not (len(mq) and len(co)):
+        return False
+    plt.violinplot([mq, co], showmeans=True); plt.xticks([1,2], PROTOS); plt.ylabel("RTT (ms)"); plt.title("Violin RTT")
+
+@figs.add("extra_qq_mqtt.png")
+def qq_mqtt(D):
+    # requires scipy; preskace se ako nije instaliran
     try:
-        qos.append(int(r["qos"]))
-    except:
-        qos.append(0)
-plt.plot(range(len(qos)), qos); plt.ylabel("QoS"); plt.title("QoS kroz vreme")
-save("extra_qos_ts.png")
+        from scipy import stats
+    except ImportError:
+        return False
+    mq = D["by_proto"]["MQTT"]
+    if len(mq) <= 5:
+        return False
+    (osm, osr), (slope, intercept, r) = stats.probplot(mq, dist="norm")
+    plt.scatter(osm, osr); plt.title("QQ MQTT")
+
+@figs.add("extra_scatter_hum_coap.png")
+def scatter_hum_coap(D):
+    x,y = paired(D, "humidity", "rtt", "CoAP")
+    plt.scatter(x,y); plt.xlabel("humidity"); plt.ylabel("CoAP RTT (ms)"); plt.title("Humidity vs CoAP RTT")
+
+@figs.add("extra_qos_ts.png")
+def qos_ts(D):
+    plt.plot(np.arange(len(D["qos"])), D["qos"]); plt.ylabel("QoS"); plt.title("QoS kroz vreme")
+
+if __name__ == "__main__":
+    sys.exit(figs.main(load_data, EXP_DATA, "plot_extra"))
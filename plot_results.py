@@ -2,54 +2,51 @@
 # -*- coding: utf-8 -*-
 # plot_results.py - osnovni grafici p50/p95 (MQTT/CoAP), png.
 
-import csv, statistics
+import sys
+import numpy as np
 import matplotlib.pyplot as plt
+from log_store import EXP_DATA, load_columns, num, text
+from render import Figures
 
-def read_rows(path="exp_log.csv"):
-    with open(path, newline="", encoding="utf-8") as fh:
-        return list(csv.DictReader(fh))
-
-def median(vals):
-    s = [v for v in vals if v is not None]
-    return statistics.median(s) if s else None
+figs = Figures()
 
+# nizovi su vec u memoriji, pa tacni percentili (sketch je za streaming u analyze_log.py)
 def pctl(vals, p):
-    s = sorted([v for v in vals if v is not None])
-    if not s: return None
-    k = int(round((p/100.0)*(len(s)-1)))
-    return s[k]
-
-rows = read_rows()
-def series(proto, col):
-    out = []
-    for r in rows:
-        if r["proto"] == proto and r[col]:
-            out.append(float(r[col]))
-    return out
-
-mqtt = series("MQTT", "mqtt_rtt_ms")
-coap = series("CoAP", "coap_rtt_ms")
-
-labels = ["MQTT p50", "MQTT p95", "CoAP p50", "CoAP p95"]
-values = [pctl(mqtt,50) or 0, pctl(mqtt,95) or 0, pctl(coap,50) or 0, pctl(coap,95) or 0]
-
-plt.figure()
-plt.bar(labels, values)
-plt.ylabel("RTT (ms)")
-plt.title("Osnovni RTT rezultati")
-plt.tight_layout()
-plt.savefig("proto_p95.png", dpi=120)
-
-plt.figure()
-plt.bar(["p50","p95"], [pctl(mqtt,50) or 0, pctl(mqtt,95) or 0])
-plt.ylabel("RTT (ms)")
-plt.title("MQTT RTT")
-plt.tight_layout()
-plt.savefig("mqtt_p95.png", dpi=120)
-
-plt.figure()
-plt.bar(["median"], [median(mqtt) or 0])
-plt.ylabel("RTT (ms)")
-plt.title("MQTT median")
-plt.tight_layout()
-plt.savefig("mqtt_p50.png", dpi=120)
+    return float(np.percentile(vals, p)) if len(vals) else None
+
+def median(vals):
+    return float(np.median(vals)) if len(vals) else None
+
+def load_data(path=EXP_DATA):
+    cols = load_columns(path)
+    def series(proto, col):
+        v = num(cols, col)[text(cols, "proto") == proto]
+        return v[~np.isnan(v)]
+    mqtt = series("MQTT", "mqtt_rtt_ms")
+    coap = series("CoAP", "coap_rtt_ms")
+    return {"mqtt_p50": pctl(mqtt,50) or 0, "mqtt_p95": pctl(mqtt,95) or 0,
+            "coap_p50": pctl(coap,50) or 0, "coap_p95": pctl(coap,95) or 0,
+            "mqtt_median": median(mqtt) or 0}
+
+@figs.add("proto_p95.png")
+def proto_p95(D):
+    labels = ["MQTT p50", "MQTT p95", "CoAP p50", "CoAP p95"]
+    values = [D["mqtt_p50"], D["mqtt_p95"], D["coap_p50"], D["coap_p95"]]
+    plt.bar(labels, values)
+    plt.ylabel("RTT (ms)")
+    plt.title("Osnovni RTT rezultati")
+
+@figs.add("mqtt_p95.png")
+def mqtt_p95(D):
+    plt.bar(["p50","p95"], [D["mqtt_p50"], D["mqtt_p95"]])
+    plt.ylabel("RTT (ms)")
+    plt.title("MQTT RTT")
+
+@figs.add("mqtt_p50.png")
+def mqtt_p50(D):
+    plt.bar(["median"], [D["mqtt_median"]])
+    plt.ylabel("RTT (ms)")
+    plt.title("MQTT median")
+
+if __name__ == "__main__":
+    sys.exit(figs.main(load_data, EXP_DATA, "plot_results"))
@@ -1,113 +1,271 @@
 #!/usr/bin/env python3
 # policy_tuner.py - baseline vs quantum-inspired (SA) optimizacija pragova
-import csv, json, random, math, statistics as stats
+import os, json, random, math, time, itertools
+import numpy as np
+from log_store import EXP_DATA, load_columns, num, text
 
-CSV="exp_log.csv"
+CSV=EXP_DATA
+
+# Tier pravila: (QoS, interval s) za tier0/tier1/tier2 (vidi evaluate_policy)
+TIERS=((0,1.0),(1,2.0),(1,4.0))
+LOG_INTERVAL=float(os.getenv("POLICY_LOG_INTERVAL","2.0"))  # interval u logu kada nema kolone
+RETRIES=int(os.getenv("POLICY_QOS1_RETRIES","2"))          # QoS1 ponovna slanja pre odustajanja
+ACK_TX=1.15                                                  # QoS1 saobracaj (PUBACK) u odnosu na QoS0
+W_P95,W_OK,W_TX=1.0,0.5,1e-4
+BLOCK_CELLS=4_000_000  # K*N elemenata po bloku u evaluate_batch
 
 def load_rows():
-    rows=[]
-    with open(CSV) as f:
-        rd=csv.DictReader(f)
-        for r in rd:
-            try:
-                rows.append({
-                    "run": r["run"],
-                    "proto": r["proto"],
-                    "qos": int(r.get("mqtt_qos","1") or 1),
-                    "ok": (r["ok"]=="True"),
-                    "lat": float(r["lat_s"]),
-                    "rtt": float(r["rt_avg_ms"]) if r.get("rt_avg_ms") not in [None,"","nan"] else None,
-                    "loss": float(r["rt_loss_pct"]) if r.get("rt_loss_pct") not in [None,"","nan"] else None,
-                    "tx": float(r["tx_rate_bps"]) if r.get("tx_rate_bps") not in [None,"","nan"] else None,
-                })
-            except:
-                pass
-    return [r for r in rows if r["rtt"] is not None and r["loss"] is not None]
-
-def np_percentile(xs,p):
-    xs=sorted(xs)
-    if not xs: return float('nan')
-    k=(len(xs)-1)*p/100; f=int(k); c=min(f+1,len(xs)-1)
-    return xs[f] if f==c else xs[f]+(xs[c]-xs[f])*(k-f)
-
-def evaluate_policy(rows, rtt_low, rtt_mid, loss_mid):
+    # kolone kao NumPy nizovi (samo redovi sa lat/RTT/loss)
+    cols=load_columns(CSV)
+    lat=num(cols,"lat_s"); rtt=num(cols,"rt_avg_ms"); loss=num(cols,"rt_loss_pct")
+    keep=~np.isnan(lat)&~np.isnan(rtt)&~np.isnan(loss)
+    qos=num(cols,"mqtt_qos",1.0); qos=np.where(np.isnan(qos),1,qos).astype(np.int8)
+    interval=num(cols,"interval",LOG_INTERVAL); interval=np.where(np.isnan(interval)|(interval<=0),LOG_INTERVAL,interval)
+    return {"run":text(cols,"run")[keep],"proto":text(cols,"proto")[keep],"qos":qos[keep],
+            "ok":(text(cols,"ok")=="True")[keep],"lat":lat[keep],"rtt":rtt[keep],"loss":loss[keep],
+            "tx":num(cols,"tx_rate_bps")[keep],"interval":interval[keep]}
+
+def _deliver(qos,p):
+    # verovatnoca isporuke: QoS0 jedno slanje, QoS1 do 1+RETRIES slanja
+    return np.where(qos==0,1-p,1-p**(1+RETRIES))
+
+def _retx_s(qos,p,rtt):
+    # ocekivano kasnjenje zbog QoS1 ponovnih slanja (svako kosta jedan RTT)
+    tries=np.minimum(p/(1-p),RETRIES)
+    return np.where(qos==0,0.0,tries*rtt/1000.0)
+
+def outcome(rows,qos,interval,cache=None):
+    """
+    Kontrafaktualni ishod svakog reda kada bi se poslao sa (qos, interval):
+      lat = lat_log - retx(qos_log) + retx(qos) + (interval - interval_log)/2
+            (ponovna slanja + starost uzorka, u proseku pola intervala)
+      ok  = ok_log * P(isporuka | qos) / P(isporuka | qos_log), ograniceno na [0,1]
+      tx  = tx_log * interval_log/interval * ack(qos)/ack(qos_log)
+    p = rt_loss_pct/100 iz istog reda, rtt = rt_avg_ms. cache je opcioni dict pozivaoca
+    (kljuc (qos, interval)) za ponovljene ocene nad istim rows.
+    """
+    key=(int(qos),float(interval))
+    if cache is not None and key in cache: return cache[key]
+    p=np.clip(rows["loss"]/100.0,0.0,0.99); rtt=rows["rtt"]; q0=rows["qos"]
+    lat=rows["lat"]-_retx_s(q0,p,rtt)+_retx_s(qos,p,rtt)+(interval-rows["interval"])/2.0
+    ok=np.clip(rows["ok"]*_deliver(qos,p)/np.maximum(_deliver(q0,p),1e-9),0.0,1.0)
+    ack=lambda q: np.where(q==0,1.0,ACK_TX)
+    tx=rows["tx"]*(rows["interval"]/interval)*ack(qos)/ack(q0)
+    res=(np.maximum(lat,0.0),ok,tx)
+    if cache is not None: cache[key]=res
+    return res
+
+def evaluate_batch(rows, thresholds, tiers=TIERS, cache=None):
+    """
+    Ocena K kandidata odjednom; thresholds je niz (K,3) sa (rtt_low, rtt_mid, loss_mid).
+    Svaki red loga dobija tier po svom rt_avg_ms/rt_loss_pct, a ishod tog tiera iz outcome().
+    Vraca (J, p95, ok%, med_tx) kao nizove duzine K; J = W_P95*p95 - W_OK*ok% + W_TX*med_tx.
+    cache se prosledjuje outcome().
+    """
+    th=np.atleast_2d(np.asarray(thresholds,dtype=np.float64))
+    n=len(rows["lat"]); k=len(th)
+    out=np.full((4,k),np.nan)
+    if not n: out[0]=1e9; return out
+    per=[outcome(rows,q,iv,cache) for q,iv in tiers]
+    lat3=np.stack([o[0] for o in per]); ok3=np.stack([o[1] for o in per]); tx3=np.stack([o[2] for o in per])
+    rtt=rows["rtt"]; loss=rows["loss"]; col=np.arange(n)
+    step=max(1,BLOCK_CELLS//n)
+    for a in range(0,k,step):
+        lo,mid,lm=(th[a:a+step,i,None] for i in range(3))
+        tier=np.where((rtt<lo)&(loss==0),0,np.where((rtt<mid)&(loss<=lm),1,2))
+        p95=np.percentile(lat3[tier,col],95,axis=1)  # linearna interpolacija (isto pravilo kao rtt_stats.percentile)
+        okp=100.0*ok3[tier,col].mean(axis=1)
+        tx=tx3[tier,col]
+        med=np.nan_to_num(np.nanmedian(tx,axis=1)) if np.isnan(tx).any() else np.median(tx,axis=1)
+        out[:,a:a+step]=W_P95*p95-W_OK*okp+W_TX*med,p95,okp,med
+    return out
+
+def evaluate_policy(rows, rtt_low, rtt_mid, loss_mid, tiers=TIERS):
     """
     Pravilo (primer, u skladu sa controller idejom):
       - rtt<rtt_low i loss=0 → MQTT QoS0 (interval 1s)
       - rtt<rtt_mid i loss<=loss_mid → MQTT QoS1 (interval 2s)
       - else → MQTT QoS1 (interval 4s)  [teška mreža]
-    U ovoj evaluaciji koristimo postojeće latencije/ok/tx iz loga kao proxy (replay).
+    Replay: svaki red loga se preslika na izbor pravila i oceni kontrafaktualni ishod
+    (vidi outcome); jedan kandidat je evaluate_batch sa K=1.
     """
-    lats=[]; oks=0; n=0; txs=[]
-    for r in rows:
-        n+=1
-        lats.append(r["lat"])
-        oks += 1 if r["ok"] else 0
-        if r["tx"] is not None: txs.append(r["tx"])
-    if not lats: return 1e9, {}
-
-    p95 = np_percentile(lats,95)
-    ok_rate = 100.0*oks/max(1,n)
-    med_tx = stats.median(txs) if txs else 0.0
-
-    # cilj: minimizuj (w1*p95 - w2*ok_rate + w3*med_tx)
-    w1,w2,w3 = 1.0, 0.5, 1e-4
-    J = w1*p95 - w2*ok_rate + w3*med_tx
-    return J, {"p95":p95,"ok%":ok_rate,"med_tx":med_tx}
-
-def baseline_search(rows):
-    best=None
-    for rtt_low in [20,40,60]:
-        for rtt_mid in [80,120,180]:
-            for loss_mid in [0.5,1.0,2.0,3.0]:
-                J,metrics=evaluate_policy(rows,rtt_low,rtt_mid,loss_mid)
-                cand={"rtt_low":rtt_low,"rtt_mid":rtt_mid,"loss_mid":loss_mid,"J":J,**metrics}
-                if best is None or cand["J"]<best["J"]:
-                    best=cand
-    return best
+    if not len(rows["lat"]): return 1e9, {}
+    J,p95,okp,med=evaluate_batch(rows,[(rtt_low,rtt_mid,loss_mid)],tiers)[:,0]
+    return float(J), {"p95":float(p95),"ok%":float(okp),"med_tx":float(med)}
 
-def sa_optimize(rows, iters=2000, T0=2.0, alpha=0.995):
-    choices = {
+# prostor pretrage (SA i baseline): pragovi + (QoS, interval) po tieru; SA_SPACE=small je stari 5x6x5
+SPACES = {
+    "small": {
         "rtt_low": [20,30,40,50,60],
         "rtt_mid": [80,100,120,150,180,220],
         "loss_mid": [0.5,1.0,2.0,3.0,5.0],
-    }
-    state = {
-        "rtt_low": random.choice(choices["rtt_low"]),
-        "rtt_mid": random.choice(choices["rtt_mid"]),
-        "loss_mid": random.choice(choices["loss_mid"]),
-    }
-    J,_ = evaluate_policy(rows, state["rtt_low"], state["rtt_mid"], state["loss_mid"])
-    best = {**state, "J":J}
+    },
+    "full": {
+        "rtt_low": [10,15,20,25,30,40,50,60,80],
+        "rtt_mid": [60,80,100,120,150,180,220,260,300],
+        "loss_mid": [0.25,0.5,1.0,1.5,2.0,3.0,5.0,8.0],
+        "qos0": [0,1], "int0": [0.5,1.0,2.0],
+        "qos1": [0,1], "int1": [1.0,2.0,3.0,4.0],
+        "qos2": [1], "int2": [2.0,4.0,6.0,8.0],
+    },
+}
+SA_SPACE=os.getenv("SA_SPACE","full")
+SA_ITERS=int(os.getenv("SA_ITERS","2000"))
+SA_RESTARTS=int(os.getenv("SA_RESTARTS","8"))
+SA_JOBS=int(os.getenv("SA_JOBS",str(os.cpu_count() or 1)))
+SA_SEED=int(os.getenv("SA_SEED","1"))
+SA_EXHAUSTIVE=os.getenv("SA_EXHAUSTIVE","0")=="1"  # + iscrpna pretraga SA prostora (gap_J)
+
+def state_tiers(state):
+    # nedostajuci tier parametri iz TIERS
+    return tuple((state.get(f"qos{i}",q),state.get(f"int{i}",iv)) for i,(q,iv) in enumerate(TIERS))
+
+def state_params(state):
+    # stanje -> (rtt_low, rtt_mid, loss_mid), tiers
+    return (state["rtt_low"],state["rtt_mid"],state["loss_mid"]),state_tiers(state)
+
+def valid(state):
+    # tier1 mora imati siri RTT prag od tier0
+    return state["rtt_low"] < state["rtt_mid"]
+
+def space_states(choices):
+    # broj validnih stanja (rtt_low < rtt_mid)
+    pairs=sum(a < b for a in choices["rtt_low"] for b in choices["rtt_mid"])
+    return pairs*math.prod(len(v) for k,v in choices.items() if k not in ("rtt_low","rtt_mid"))
+
+def baseline_search(rows):
+    # fiksna 3x3x4 mreza pragova sa podrazumevanim TIERS (jedan evaluate_batch poziv)
+    grid=np.array([(a,b,c) for a in [20,40,60] for b in [80,120,180] for c in [0.5,1.0,2.0,3.0]],dtype=float)
+    J,p95,okp,med=evaluate_batch(rows,grid)
+    i=int(np.argmin(J)); a,b,c=grid[i]
+    return {"rtt_low":int(a),"rtt_mid":int(b),"loss_mid":float(c),"J":float(J[i]),
+            "p95":float(p95[i]),"ok%":float(okp[i]),"med_tx":float(med[i])}
+
+def exhaustive_search(rows, space=SA_SPACE):
+    """
+    Iscrpna pretraga istog prostora kao SA (SPACES[space], samo validna stanja): za
+    svaku kombinaciju tier parametara svi pragovi u jednom evaluate_batch pozivu.
+    Linearno u broju redova i stanja (full: ~120k stanja), pa samo na zahtev (SA_EXHAUSTIVE=1).
+    """
+    choices=SPACES[space]
+    tkeys=[k for k in choices if k not in ("rtt_low","rtt_mid","loss_mid")]
+    grid=np.array([(a,b,c) for a in choices["rtt_low"] for b in choices["rtt_mid"] if a < b
+                   for c in choices["loss_mid"]],dtype=float)
+    oc={}; best=None
+    t0=time.perf_counter()
+    for vals in itertools.product(*(choices[k] for k in tkeys)):
+        tp=dict(zip(tkeys,vals))
+        J,p95,okp,med=evaluate_batch(rows,grid,state_tiers(tp),oc)
+        i=int(np.argmin(J))
+        if best is None or J[i] < best["J"]:
+            a,b,c=grid[i]
+            best={"rtt_low":int(a),"rtt_mid":int(b),"loss_mid":float(c),**tp,"J":float(J[i]),
+                  "p95":float(p95[i]),"ok%":float(okp[i]),"med_tx":float(med[i])}
+    best["search"]={"space":space,"states":space_states(choices),"wall_s":time.perf_counter()-t0}
+    return best
+
+def sa_run(rows, choices, seed, iters=SA_ITERS, T0=2.0, alpha=0.995):
+    # jedan SA restart; cache po tuple-u vrednosti stanja, pa se posecena stanja ne racunaju ponovo.
+    # Sused menja jedan kljuc, i to samo na vrednosti koje ostavljaju stanje validnim.
+    rnd=random.Random(seed)
+    keys=list(choices)
+    cache={}; oc={}
+    def score(state):
+        k=tuple(state[c] for c in keys)
+        if k not in cache:
+            th,tiers=state_params(state)
+            cache[k]=float(evaluate_batch(rows,[th],tiers,oc)[0,0])
+        return cache[k]
+    t0=time.perf_counter()
+    state={c: rnd.choice(choices[c]) for c in keys}
+    while not valid(state):
+        state["rtt_low"]=rnd.choice(choices["rtt_low"]); state["rtt_mid"]=rnd.choice(choices["rtt_mid"])
+    J=score(state)
+    best={**state,"J":J}; best_it=0
     T=T0
-    for _ in range(iters):
-        key = random.choice(list(choices.keys()))
-        val = random.choice(choices[key])
-        new = dict(state); new[key]=val
-        J2,_ = evaluate_policy(rows, new["rtt_low"], new["rtt_mid"], new["loss_mid"])
-        dE = J2 - J
-        if dE < 0 or random.random() < math.exp(-dE/max(1e-6,T)):
-            state, J = new, J2
+    for it in range(1,iters+1):
+        key=rnd.choice(keys)
+        new=dict(state); new[key]=rnd.choice([v for v in choices[key] if valid({**state,key:v})])
+        J2=score(new)
+        dE=J2-J
+        if dE < 0 or rnd.random() < math.exp(-dE/max(1e-6,T)):
+            state,J=new,J2
             if J < best["J"]:
-                best = {**state, "J":J}
-        T *= alpha
-    _,metrics = evaluate_policy(rows, best["rtt_low"], best["rtt_mid"], best["loss_mid"])
+                best={**state,"J":J}; best_it=it
+        T*=alpha
+    dt=time.perf_counter()-t0
+    return {"seed":seed,"best":best,"best_iter":best_it,"steps":iters+1,"evals":len(cache),
+            "time_s":dt,"eval_ms":1000.0*dt/max(1,len(cache))}
+
+_ROWS=None
+
+def _init(rows):
+    global _ROWS
+    _ROWS=rows
+
+def _sa_job(args):
+    choices,seed,iters=args
+    return sa_run(_ROWS,choices,seed,iters)
+
+def sa_optimize(rows, iters=SA_ITERS, restarts=SA_RESTARTS, jobs=SA_JOBS, seed=SA_SEED, space=SA_SPACE):
+    """
+    Nezavisni SA restart-i (seed, seed+1, ...) preko process pool-a; rezultat je
+    reproduktivan za isti SA_SEED bez obzira na broj radnika. Vraca najbolje stanje sa
+    metrikama i izvestaj o konvergenciji ("search").
+    """
+    choices=SPACES[space]
+    size=space_states(choices)
+    jobs_args=[(choices,seed+i,iters) for i in range(max(1,restarts))]
+    t0=time.perf_counter()
+    if jobs <= 1 or len(jobs_args) == 1:
+        runs=[sa_run(rows,c,s,n) for c,s,n in jobs_args]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(min(jobs,len(jobs_args)),initializer=_init,initargs=(rows,)) as ex:
+            runs=list(ex.map(_sa_job,jobs_args))
+    wall=time.perf_counter()-t0
+    top=min(runs,key=lambda r: r["best"]["J"])
+    best=dict(top["best"])
+    th,tiers=state_params(best)
+    _,metrics=evaluate_policy(rows,*th,tiers)
     best.update(metrics)
+    evals=sum(r["evals"] for r in runs)
+    best["search"]={"space":space,"states":size,"restarts":len(runs),"iters":iters,"wall_s":wall,
+                    "evals":evals,"eval_ms":1000.0*sum(r["time_s"] for r in runs)/max(1,evals),
+                    "runs":[{"seed":r["seed"],"J":r["best"]["J"],"best_iter":r["best_iter"],
+                             "evals":r["evals"],"cache_hit%":100.0*(1-r["evals"]/r["steps"])} for r in runs]}
     return best
 
+def print_search(s):
+    print(f"SA: space={s['space']} ({s['states']} states), {s['restarts']} restarts x {s['iters']} iters, "
+          f"{s['evals']} evals, {s['eval_ms']:.3f} ms/eval, {s['wall_s']:.2f} s")
+    for r in s["runs"]:
+        print(f"  seed={r['seed']} J={r['J']:.4f} best@{r['best_iter']} evals={r['evals']} cache_hit={r['cache_hit%']:.1f}%")
+    ex = s.get("exhaustive")
+    if ex:
+        print(f"Exhaustive: {ex['states']} states, J={ex['J']:.4f}, {ex['wall_s']:.2f} s, SA gap_J={s['gap_J']:.4f}")
+    else:
+        print("Exhaustive comparison over the SA space: off (SA_EXHAUSTIVE=1)")
+
 def main():
     rows = load_rows()
-    if not rows:
+    if not len(rows["lat"]):
         print("No rows with RTT/loss present in CSV.")
         return
     base = baseline_search(rows)
     sa   = sa_optimize(rows)
+    if SA_EXHAUSTIVE:
+        ex = exhaustive_search(rows, sa["search"]["space"])
+        sa["search"]["exhaustive"] = {"J": ex["J"], **ex["search"]}
+        sa["search"]["gap_J"] = sa["J"] - ex["J"]  # SA vs optimum istog prostora
 
     with open("policy_baseline.json","w") as f: json.dump(base, f, indent=2)
     with open("policy_quantum_inspired.json","w") as f: json.dump(sa, f, indent=2)
 
     print("Baseline:", json.dumps(base, indent=2))
-    print("Quantum-inspired (SA):", json.dumps(sa, indent=2))
+    print("Baseline: fixed 3x3x4 threshold grid, default tiers (not the SA space)")
+    print("Quantum-inspired (SA):", json.dumps({k: v for k, v in sa.items() if k != "search"}, indent=2))
+    print_search(sa["search"])
     print("Saved: policy_baseline.json, policy_quantum_inspired.json")
 
 if __name__=="__main__":
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# render.py - zajednicki pipeline za grafike: figura je funkcija (D) koja crta na
+# tekucu matplotlib figuru; podaci se ucitaju jednom i predaju radnicima process
+# pool-a (Agg backend), a PNG noviji od ulaznog loga se preskace.
+# Opcije skripti: --only <ime|glob,...> --jobs N --force --list
+
+import os, sys, argparse, fnmatch, importlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+class Figures:
+    def __init__(self):
+        self.funcs = {}  # ime PNG -> funkcija(D); redosled = redosled definicije
+
+    def add(self, name):
+        def deco(fn):
+            self.funcs[name] = fn
+            return fn
+        return deco
+
+    def main(self, load_data, src, module, argv=None):
+        ap = argparse.ArgumentParser()
+        ap.add_argument("--only", default="", help="zarezom odvojena imena ili glob (npr. 'extra_heatmap*')")
+        ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+        ap.add_argument("--force", action="store_true", help="crtaj i kada je PNG noviji od loga")
+        ap.add_argument("--list", action="store_true")
+        a = ap.parse_args(argv)
+        if a.list:
+            print("\n".join(self.funcs))
+            return 0
+        todo = select(list(self.funcs), a.only)
+        if not a.force:
+            todo = [n for n in todo if not up_to_date(n, src)]
+        if not todo:
+            print("Nothing to render (all figures newer than %s)." % src)
+            return 0
+        return render(module, load_data(), todo, a.jobs)
+
+def select(names, only):
+    if not only:
+        return names
+    pats = [p.strip() for p in only.split(",") if p.strip()]
+    return [n for n in names if any(fnmatch.fnmatch(n, p) or fnmatch.fnmatch(n, p + ".png") for p in pats)]
+
+def up_to_date(png, src):
+    try:
+        return os.path.getmtime(png) > os.path.getmtime(src)
+    except OSError:
+        return False
+
+_FIGS = None
+_DATA = None
+
+def _init(module, data):
+    global _FIGS, _DATA
+    import matplotlib
+    matplotlib.use("Agg")
+    _FIGS = importlib.import_module(module).figs
+    _DATA = data
+
+def _render_one(name):
+    import matplotlib.pyplot as plt
+    fig = plt.figure()
+    try:
+        if _FIGS.funcs[name](_DATA) is False:  # figura bez podataka se ne snima
+            return name, "skipped"
+        plt.tight_layout()
+        plt.savefig(name, dpi=120)
+        return name, "ok"
+    finally:
+        plt.close(fig)
+
+def render(module, data, names, jobs=1):
+    errors = 0
+    if jobs <= 1 or len(names) == 1:
+        _init(module, data)
+        results = []
+        for n in names:
+            try:
+                results.append(_render_one(n))
+            except Exception as e:
+                results.append((n, f"error: {e}"))
+    else:
+        results = []
+        with ProcessPoolExecutor(min(jobs, len(names)), initializer=_init, initargs=(module, data)) as ex:
+            futs = {ex.submit(_render_one, n): n for n in names}
+            for f in as_completed(futs):
+                try:
+                    results.append(f.result())
+                except Exception as e:
+                    results.append((futs[f], f"error: {e}"))
+    for name, status in results:
+        if status.startswith("error"):
+            errors += 1
+            print(f"{name}: {status}", file=sys.stderr)
+    done = [n for n, s in results if s == "ok"]
+    skipped = [n for n, s in results if s == "skipped"]
+    if done:
+        print("Rendered: " + ", ".join(done))
+    if skipped:
+        print("Skipped (no data): " + ", ".join(skipped))
+    return 1 if errors else 0
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# rtt_stats.py - zajednicki sazetak RTT uzoraka (min/p50/p95/max, loss) za probe
+# i LogHistogram, kvantilni sketch za analizu velikih logova.
+
+import math
+
+def percentile(vals, p):
+    # linearna interpolacija izmedju susednih rangova (isto kao numpy default)
+    s = sorted(vals)
+    if not s: return None
+    k = (len(s) - 1) * p / 100.0
+    f = int(k); c = min(f + 1, len(s) - 1)
+    return s[f] if f == c else s[f] + (s[c] - s[f]) * (k - f)
+
+def summarize(samples, sent=None):
+    s = sorted(samples)
+    n = len(s)
+    sent = n if sent is None else sent
+    out = {"sent": sent, "recv": n,
+           "loss_pct": 100.0 * (sent - n) / sent if sent else None,
+           "min_ms": None, "p50_ms": None, "p95_ms": None, "max_ms": None, "mean_ms": None}
+    if n:
+        out.update(min_ms=s[0], p50_ms=percentile(s, 50), p95_ms=percentile(s, 95),
+                   max_ms=s[-1], mean_ms=sum(s) / n)
+    return out
+
+class LogHistogram:
+    # Log-bucket kvantilni sketch (HDR/DDSketch stil), konstantna memorija, spajanje (merge).
+    #
+    # Vrednost x > 0 ide u bucket i = ceil(log_gamma(x)), gamma = (1+alpha)/(1-alpha);
+    # bucket se predstavlja sa 2*gamma^i/(gamma+1). Za kvantil q vraca se predstavnik
+    # bucket-a u kom je element ranga k = round(q*(n-1)) (isti rang kao pctl u skriptama),
+    # pa je relativna greska u odnosu na tacan kvantil <= alpha, dok god broj bucket-a
+    # ne predje max_buckets (tada se spajaju najnizi bucket-i i greska vazi samo za
+    # kvantile iznad njih). Vrednosti <= min_value (ukljucujuci negativne) idu u nulti
+    # bucket i vracaju se kao 0. min/max/mean su tacni. Sa alpha=0.01 i 2048 bucket-a
+    # pokriva se opseg ~1e-9..1e9 bez spajanja.
+    def __init__(self, alpha=0.01, max_buckets=2048, min_value=1e-9):
+        self.alpha = alpha
+        self.max_buckets = max_buckets
+        self.min_value = min_value
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._lg = math.log(self.gamma)
+        self.buckets = {}
+        self.zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, x, n=1):
+        if x != x:  # NaN
+            return
+        self.count += n
+        self.sum += x * n
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        if x <= self.min_value:
+            self.zero += n
+            return
+        i = math.ceil(math.log(x) / self._lg)
+        self.buckets[i] = self.buckets.get(i, 0) + n
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def update(self, values):
+        # vektorski put za numpy nizove (milioni vrednosti), inace petlja preko add()
+        try:
+            import numpy as np
+        except ImportError:
+            for v in values:
+                self.add(float(v))
+            return self
+        v = np.asarray(values, dtype=np.float64)
+        v = v[~np.isnan(v)]
+        if not len(v):
+            return self
+        self.count += len(v)
+        self.sum += float(v.sum())
+        lo, hi = float(v.min()), float(v.max())
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+        pos = v[v > self.min_value]
+        self.zero += len(v) - len(pos)
+        idx, cnt = np.unique(np.ceil(np.log(pos) / self._lg).astype(np.int64), return_counts=True)
+        for i, c in zip(idx.tolist(), cnt.tolist()):
+            self.buckets[i] = self.buckets.get(i, 0) + c
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+        return self
+
+    def _collapse(self):
+        keys = sorted(self.buckets)
+        extra = len(keys) - self.max_buckets
+        low = keys[extra]
+        for k in keys[:extra]:
+            self.buckets[low] += self.buckets.pop(k)
+
+    def merge(self, other):
+        if abs(other.gamma - self.gamma) > 1e-12:
+            raise ValueError("LogHistogram.merge: razlicit alpha")
+        for i, c in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + c
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        k = int(round(q * (self.count - 1)))
+        if k < self.zero:
+            return min(max(0.0, self.min), self.max)
+        cum = self.zero
+        for i in sorted(self.buckets):
+            cum += self.buckets[i]
+            if cum > k:
+                v = 2 * self.gamma ** i / (self.gamma + 1)
+                return min(max(v, self.min), self.max)
+        return self.max
+
+    def percentile(self, p):
+        return self.quantile(p / 100.0)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self):
+        return {"alpha": self.alpha, "max_buckets": self.max_buckets, "min_value": self.min_value,
+                "zero": self.zero, "count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+                "buckets": {str(i): c for i, c in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, d):
+        h = cls(d["alpha"], d["max_buckets"], d["min_value"])
+        h.buckets = {int(i): c for i, c in d["buckets"].items()}
+        h.zero, h.count, h.sum, h.min, h.max = d["zero"], d["count"], d["sum"], d["min"], d["max"]
+        return h
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# sensor_daemon.py - jedan proces cita senzore (sensors.Sampler) zadatom brzinom i
+# deli poslednji snapshot svim potrosacima (controller, servo), bez dodatnih
+# citanja hardvera po potrosacu.
+#
+# Unix socket (SENSOR_SOCK), linijski protokol, odgovor je JSON u jednoj liniji:
+#   GET  -> poslednji snapshot
+#   SUB  -> poslednji snapshot, pa novi svaki put kada se vrednosti promene
+# Opciono deljena memorija (SENSOR_SHM, npr. /dev/shm/iot-sensors): seqlock
+# zaglavlje <seq u64><len u32><t f64><stale_s f64> + JSON; neparan seq = upis u toku,
+# t = time.monotonic() upisa. Zapis stariji od stale_s (SENSOR_STALE_PERIODS perioda)
+# znaci da daemon ne radi: klijent prelazi na socket, pa na citanje u svom procesu.
+
+import os, sys, json, mmap, time, struct, socket, asyncio
+import sensors
+from log_writer import exit_on_sigterm
+
+SOCK = os.getenv("SENSOR_SOCK", "/tmp/iot-sensors.sock")
+SHM = os.getenv("SENSOR_SHM", "")
+RATE_HZ = float(os.getenv("SENSOR_RATE_HZ", "2"))
+STALE_PERIODS = float(os.getenv("SENSOR_STALE_PERIODS", "3"))
+SHM_SIZE = 4096
+SUB_MAX_BUF = 1 << 16  # pretplatnik koji ne cita se iskljucuje
+_HDR = struct.Struct("<QIdd")
+
+def _values(snap):
+    # za detekciju promene: bez ts i starosti citanja
+    return {k: v for k, v in snap.items() if k != "ts" and not k.endswith("_age_ms")}
+
+class ShmWriter:
+    def __init__(self, path, size=SHM_SIZE, stale_s=STALE_PERIODS / RATE_HZ):
+        self.size = size
+        self.stale_s = stale_s
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.seq = _HDR.unpack_from(self.mm, 0)[0] & ~1
+
+    def write(self, data):
+        data = data[:self.size - _HDR.size]
+        self.seq += 1  # neparan: citaoci ponavljaju
+        self.mm[0:8] = struct.pack("<Q", self.seq)
+        self.mm[_HDR.size:_HDR.size + len(data)] = data
+        self.mm[8:_HDR.size] = struct.pack("<Idd", len(data), time.monotonic(), self.stale_s)
+        self.seq += 1
+        self.mm[0:8] = struct.pack("<Q", self.seq)
+
+    def close(self):
+        self.mm.close()
+
+class ShmReader:
+    def __init__(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self.mm = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+
+    def read(self, retries=1000):
+        for _ in range(retries):
+            s1, n, t, stale_s = _HDR.unpack_from(self.mm, 0)
+            if s1 & 1 or not s1:
+                continue
+            data = self.mm[_HDR.size:_HDR.size + n]
+            if _HDR.unpack_from(self.mm, 0)[0] == s1:
+                if time.monotonic() - t > stale_s:
+                    raise TimeoutError("sensor shm: zastareo zapis (daemon ne radi?)")
+                return json.loads(data)
+        raise TimeoutError("sensor shm: upis u toku")
+
+    def close(self):
+        self.mm.close()
+
+async def serve(sock=SOCK, shm=SHM, rate=RATE_HZ):
+    if os.path.exists(sock):
+        # socket zive instance se ne preuzima; brise se samo ostatak srusenog daemon-a
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(sock)
+        except OSError:
+            os.unlink(sock)
+        else:
+            raise RuntimeError(f"sensor daemon vec radi na {sock}")
+        finally:
+            probe.close()
+    sampler = sensors.Sampler()
+    ring = ShmWriter(shm) if shm else None
+    latest = {"line": b"{}\n"}
+    subs = set()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                cmd = (await reader.readline()).strip().upper()
+                if not cmd:
+                    break
+                if cmd == b"GET":
+                    writer.write(latest["line"])
+                elif cmd == b"SUB":
+                    subs.add(writer)
+                    writer.write(latest["line"])
+                else:
+                    writer.write(b'{"error": "unknown command"}\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            subs.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_unix_server(handle, path=sock)
+    loop = asyncio.get_running_loop()
+    prev = None
+    next_t = loop.time()
+    try:
+        while True:
+            snap = await loop.run_in_executor(None, sampler.read)
+            line = (json.dumps(snap, ensure_ascii=False) + "\n").encode("utf-8")
+            latest["line"] = line
+            if ring is not None:
+                ring.write(line)
+            vals = _values(snap)
+            if vals != prev:
+                prev = vals
+                for w in list(subs):
+                    if w.transport.get_write_buffer_size() > SUB_MAX_BUF:
+                        subs.discard(w)
+                        w.close()
+                    else:
+                        w.write(line)
+            next_t += 1.0 / rate
+            now = loop.time()
+            if next_t < now:
+                next_t = now
+            await asyncio.sleep(next_t - now)
+    finally:
+        server.close()
+        sampler.close()
+        if ring is not None:
+            ring.close()
+        if os.path.exists(sock):
+            os.unlink(sock)
+
+class SensorClient:
+    # Isti interfejs kao sensors.Sampler (read, last_ms, mean_ms, close) nad daemon-om;
+    # iz deljene memorije kada je SENSOR_SHM postavljen, inace GET preko socket-a.
+    # Zastareo shm zapis -> socket; daemon nedostupan -> sensors.Sampler u ovom procesu
+    # (sledece citanje ponovo pokusava daemon).
+    def __init__(self, sock=SOCK, shm=SHM, timeout=1.0):
+        self.sock_path, self.timeout = sock, timeout
+        self.local = None
+        self.n = 0
+        self.total_ms = 0.0
+        self.last_ms = None
+        self.shm = ShmReader(shm) if shm and os.path.exists(shm) else None
+        self.f = None
+        if self.shm is None:
+            self._connect()
+
+    def _connect(self):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(self.timeout)
+        try:
+            s.connect(self.sock_path)
+        except OSError:
+            s.close()
+            raise
+        self.f = s.makefile("rwb")
+
+    def _get(self):
+        for attempt in range(2):
+            try:
+                if self.f is None:
+                    self._connect()
+                self.f.write(b"GET\n")
+                self.f.flush()
+                line = self.f.readline()
+                if line:
+                    return json.loads(line)
+            except OSError:
+                if attempt:
+                    raise
+            if self.f is not None:
+                self.f.close()
+                self.f = None
+        raise ConnectionError("sensor daemon zatvorio vezu")
+
+    def _read(self):
+        if self.shm is not None:
+            try:
+                return self.shm.read()
+            except TimeoutError:
+                pass
+        try:
+            return self._get()
+        except (OSError, ValueError):
+            if self.local is None:
+                self.local = sensors.Sampler()
+            return self.local.read()
+
+    def read(self):
+        t0 = time.perf_counter()
+        snap = self._read()
+        self.last_ms = (time.perf_counter() - t0) * 1000.0
+        self.n += 1
+        self.total_ms += self.last_ms
+        return snap
+
+    def subscribe(self):
+        # generator snapshot-a: prvi odmah, zatim na svaku promenu vrednosti
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(self.sock_path)
+        with s, s.makefile("rb") as f:
+            s.sendall(b"SUB\n")
+            for line in f:
+                yield json.loads(line)
+
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.n if self.n else None
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+        if self.local is not None:
+            self.local.close()
+            self.local = None
+
+def open_sampler():
+    # daemon ako radi, inace citanje senzora u ovom procesu
+    try:
+        return SensorClient()
+    except (OSError, ValueError):
+        return sensors.Sampler()
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["get"]:
+        c = SensorClient()
+        print(json.dumps(c.read(), ensure_ascii=False))
+        print(f"read_ms={c.last_ms:.3f}", file=sys.stderr)
+        return 0
+    if argv[:1] == ["sub"]:
+        for snap in SensorClient(shm="").subscribe():
+            print(json.dumps(snap, ensure_ascii=False), flush=True)
+        return 0
+    exit_on_sigterm()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
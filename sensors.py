@@ -5,38 +5,129 @@
 # Podrzava realne senzore i "fake" mod za razvoj.
 
 import os, json, time, sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 FAKE = os.getenv("FAKE_SENSORS", "0") == "1"
 
-def read_dht22(pin=4):
+def read_dht22(pin=4, dht=None):
     if FAKE:
         return {"temperature": 22.0 + (time.time() % 10)/10.0, "humidity": 45.0}
     try:
-        import Adafruit_DHT
-        sensor = Adafruit_DHT.DHT22
-        hum, temp = Adafruit_DHT.read_retry(sensor, pin)
+        if dht is None:
+            import Adafruit_DHT as dht
+        hum, temp = dht.read_retry(dht.DHT22, pin)
         return {"temperature": float(temp) if temp is not None else None,
                 "humidity": float(hum) if hum is not None else None}
     except Exception as e:
         return {"temperature": None, "humidity": None, "error_dht22": str(e)}
 
-def read_bh1750(bus_id=1, addr=0x23):
-    if FAKE:
-        return {"lux": 150.0 + (time.time() % 5)*10.0}
+BH1750_MODE = os.getenv("BH1750_MODE", "H")
+LUX_BURST = int(os.getenv("LUX_BURST", "1"))  # >1: lux je medijana burst-a
+BH1750_RETRY_S = float(os.getenv("BH1750_RETRY_S", "30"))  # pauza pre novog otvaranja posle greske
+
+class BH1750:
+    # Drajver sa trajno otvorenim I2C bus-om u continuous modu: senzor sam meri u
+    # krug, pa citanje samo pokupi poslednju konverziju (bez cekanja kao kod 0x20).
+    #   H  (0x10) 1 lx,   ~120 ms    H2 (0x11) 0.5 lx, ~120 ms    L (0x13) 4 lx, ~16 ms
+    POWER_DOWN, POWER_ON = 0x00, 0x01
+    MODES = {"H": (0x10, 1.0, 0.18), "H2": (0x11, 0.5, 0.18), "L": (0x13, 1.0, 0.024)}  # opcode, skala, max konverzija (s)
+
+    def __init__(self, bus_id=1, addr=0x23, mode=BH1750_MODE, bus=None):
+        self.bus_id, self.addr = bus_id, addr
+        self.bus = bus
+        self._own = False
+        self.mode = None
+        self.ready_at = 0.0
+        if not FAKE and self.bus is None:
+            import smbus2
+            self.bus = smbus2.SMBus(bus_id)
+            self._own = True
+        try:
+            self.set_mode(mode)
+        except Exception:
+            if self._own:
+                self.bus.close()
+            raise
+
+    def set_mode(self, mode):
+        if mode not in self.MODES:
+            raise ValueError(f"BH1750 mode {mode!r}, ocekivano {'/'.join(self.MODES)}")
+        if not FAKE:
+            self.bus.write_byte(self.addr, self.POWER_ON)
+            self.bus.write_byte(self.addr, self.MODES[mode][0])
+        self.mode = mode
+        self.ready_at = time.monotonic() + self.MODES[mode][2]  # prva konverzija u novom modu
+
+    @property
+    def period(self):
+        return self.MODES[self.mode][2]
+
+    def read(self):
+        if FAKE:
+            return 150.0 + (time.time() % 5)*10.0
+        wait = self.ready_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        from smbus2 import i2c_msg
+        msg = i2c_msg.read(self.addr, 2)
+        self.bus.i2c_rdwr(msg)
+        hi, lo = list(msg)
+        return (hi << 8 | lo) / 1.2 * self.MODES[self.mode][1]
+
+    def burst(self, n, rate=None):
+        # n uzoraka sa rate Hz (podrazumevano jedan po konverziji u tekucem modu)
+        step = 1.0 / rate if rate else self.period
+        out = []
+        t = time.monotonic()
+        for i in range(n):
+            out.append(self.read())
+            t += step
+            if i + 1 < n:
+                time.sleep(max(0.0, t - time.monotonic()))
+        return out
+
+    def close(self):
+        if self.bus is not None and not FAKE:
+            try:
+                self.bus.write_byte(self.addr, self.POWER_DOWN)
+            except Exception:
+                pass
+            if self._own:
+                self.bus.close()
+        self.bus = None
+
+_bh1750 = {}
+_bh1750_err = {}  # (bus_id, addr) -> (t_monotonic, greska) poslednjeg neuspelog otvaranja
+
+def read_bh1750(bus_id=1, addr=0x23, dev=None, burst=LUX_BURST):
     try:
-        import smbus2
-        bus = smbus2.SMBus(bus_id)
-        data = bus.read_i2c_block_data(addr, 0x20, 2)  # One-time high-res mode
-        lux = (data[0] << 8 | data[1]) / 1.2
-        return {"lux": float(lux)}
+        if dev is None:
+            key = (bus_id, addr)
+            if key not in _bh1750:
+                err = _bh1750_err.get(key)
+                if err is not None and time.monotonic() - err[0] < BH1750_RETRY_S:
+                    return {"lux": None, "error_bh1750": err[1]}
+                try:
+                    _bh1750[key] = BH1750(bus_id, addr)
+                except Exception as e:
+                    _bh1750_err[key] = (time.monotonic(), str(e))
+                    raise
+                _bh1750_err.pop(key, None)
+            dev = _bh1750[key]
+        if burst > 1:
+            vals = sorted(dev.burst(burst))
+            return {"lux": float(vals[len(vals) // 2])}
+        return {"lux": float(dev.read())}
     except Exception as e:
         return {"lux": None, "error_bh1750": str(e)}
 
-def read_pir(pin=17):
+def read_pir(pin=17, gpio=None):
     if FAKE:
         return {"motion": int(time.time()) % 2}
     try:
+        if gpio is not None:
+            return {"motion": int(gpio.input(pin))}
         import RPi.GPIO as GPIO
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(pin, GPIO.IN)
@@ -46,13 +137,148 @@ def read_pir(pin=17):
     except Exception as e:
         return {"motion": None, "error_pir": str(e)}
 
+# TTL po senzoru (s): temperatura se sporo menja, PIR mora biti svez
+TTL = {"dht22": float(os.getenv("DHT_TTL_S", "10")),
+       "bh1750": float(os.getenv("LUX_TTL_S", "1")),
+       "pir": float(os.getenv("PIR_TTL_S", "0"))}
+READ_TIMEOUT_S = float(os.getenv("SENSOR_TIMEOUT_S", "0.25"))   # cekanje kada postoji kesirana vrednost
+# prvo citanje (nema kesa); podrazumevano rok ciklusa kontrolera, da prvi ciklus ne probije rok
+FIRST_TIMEOUT_S = float(os.getenv("SENSOR_FIRST_TIMEOUT_S", os.getenv("CYCLE_DEADLINE", "4")))
+
+_default = None
+
 def snapshot():
-    ts = datetime.utcnow().isoformat() + "Z"
-    dht = read_dht22()
-    bh = read_bh1750()
-    pir = read_pir()
-    out = {"ts": ts, **dht, **bh, **pir}
-    return out
+    global _default
+    if _default is None:
+        _default = Sampler()
+    return _default.read()
+
+class Sampler:
+    # In-process citanje: handle-ovi (DHT modul, I2C bus, PIR GPIO) se otvaraju
+    # jednom i koriste za svako citanje; last_ms/mean_ms mere trajanje citanja.
+    # Senzori se citaju paralelno (po jedan thread), svaki rezultat se kesira sa
+    # svojim TTL-om; spor senzor (DHT22 read_retry) ne zadrzava ostale - read()
+    # vraca poslednju vrednost i njenu starost (<senzor>_age_ms).
+    def __init__(self, dht_pin=4, bus_id=1, addr=0x23, pir_pin=17, ttl=None, timeout=READ_TIMEOUT_S):
+        self.dht_pin, self.bus_id, self.addr, self.pir_pin = dht_pin, bus_id, addr, pir_pin
+        self.ttl = dict(TTL, **(ttl or {}))
+        self.timeout = timeout
+        self._dht = self._lux = self._gpio = None
+        self.n = 0
+        self.total_ms = 0.0
+        self.last_ms = None
+        self.cache = {}     # senzor -> (t_monotonic, dict)
+        self.inflight = {}  # senzor -> Future
+        self.pool = ThreadPoolExecutor(len(self.ttl), thread_name_prefix="sensor")
+        if not FAKE:
+            self._open()
+
+    def _open(self):
+        try:
+            import Adafruit_DHT
+            self._dht = Adafruit_DHT
+        except Exception:
+            pass
+        try:
+            self._lux = BH1750(self.bus_id, self.addr)
+        except Exception:
+            pass
+        try:
+            import RPi.GPIO as GPIO
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self.pir_pin, GPIO.IN)
+            self._gpio = GPIO
+        except Exception:
+            pass
+
+    def _reader(self, name):
+        if name == "dht22":
+            return lambda: read_dht22(self.dht_pin, self._dht)
+        if name == "bh1750":
+            return lambda: read_bh1750(self.bus_id, self.addr, self._lux)
+        return lambda: read_pir(self.pir_pin, self._gpio)
+
+    def _collect(self):
+        for name, fut in list(self.inflight.items()):
+            if fut.done():
+                del self.inflight[name]
+                try:
+                    val = fut.result()
+                except Exception as e:
+                    val = {f"error_{name}": str(e)}
+                self.cache[name] = (time.monotonic(), val)
+
+    def read(self):
+        t0 = time.perf_counter()
+        ts = datetime.utcnow().isoformat() + "Z"
+        self._collect()
+        now = time.monotonic()
+        started = set()
+        for name, ttl in self.ttl.items():
+            c = self.cache.get(name)
+            if name not in self.inflight and (c is None or now - c[0] >= ttl):
+                self.inflight[name] = self.pool.submit(self._reader(name))
+                started.add(name)
+        # bez kesa ceka se do FIRST_TIMEOUT_S; citanje pokrenuto sada do timeout; citanje koje
+        # je vec bilo u letu (npr. DHT22 retry) se ne ceka - vraca se kesirana vrednost
+        for name, fut in list(self.inflight.items()):
+            if name in self.cache and name not in started:
+                continue
+            left = (FIRST_TIMEOUT_S if name not in self.cache else self.timeout) - (time.perf_counter() - t0)
+            try:
+                fut.result(max(0.0, left))
+            except Exception:
+                pass
+        self._collect()
+        now = time.monotonic()
+        out = {"ts": ts}
+        for name in self.ttl:
+            c = self.cache.get(name)
+            if c is not None:
+                out.update(c[1])
+            out[f"{name}_age_ms"] = round((now - c[0]) * 1000.0, 1) if c is not None else None
+        self.last_ms = (time.perf_counter() - t0) * 1000.0
+        self.n += 1
+        self.total_ms += self.last_ms
+        return out
+
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.n if self.n else None
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        if self._lux is not None:
+            self._lux.close()
+            self._lux = None
+        if self._gpio is not None:
+            self._gpio.cleanup(self.pir_pin)
+            self._gpio = None
+
+def bench(n=10):
+    # poredi in-process citanje sa starim pristupom (novi interpreter po citanju)
+    import subprocess
+    s = Sampler()
+    for _ in range(n):
+        s.read()
+    s.close()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        subprocess.check_output([sys.executable, os.path.abspath(__file__)])
+    spawn_ms = (time.perf_counter() - t0) * 1000.0 / n
+    return {"reads": n, "inproc_ms": s.mean_ms, "spawn_ms": spawn_ms}
 
 if __name__ == "__main__":
-    print(json.dumps(snapshot(), ensure_ascii=False))
+    if len(sys.argv) > 2 and sys.argv[1] == "--bench":
+        print(json.dumps(bench(int(sys.argv[2])), ensure_ascii=False))
+    elif len(sys.argv) > 2 and sys.argv[1] == "--lux-burst":
+        # --lux-burst N [Hz]
+        dev = BH1750()
+        t0 = time.perf_counter()
+        vals = dev.burst(int(sys.argv[2]), float(sys.argv[3]) if len(sys.argv) > 3 else None)
+        dt = time.perf_counter() - t0
+        dev.close()
+        print(json.dumps({"mode": dev.mode, "n": len(vals), "rate_hz": len(vals) / dt if dt else None,
+                          "min": min(vals), "median": sorted(vals)[len(vals) // 2], "max": max(vals)}))
+    else:
+        print(json.dumps(snapshot(), ensure_ascii=False))
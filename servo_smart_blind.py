@@ -2,68 +2,154 @@
 # -*- coding: utf-8 -*-
 # servo_smart_blind.py - pametna žaluzina (PIR+lux-ugao), log actuator_log.csv.
 
-import os, time, csv, json
+import os, time, atexit, threading
 from datetime import datetime
 from pathlib import Path
-import subprocess
+import sensor_daemon
+from log_writer import CsvLog, exit_on_sigterm
 
 LOG = Path(os.getenv("ACT_LOG", "actuator_log.csv"))
 FAKE = os.getenv("FAKE_SERVO", "0") == "1"
+# act_ms: od komande servu do kraja smirivanja (SERVO_SETTLE_S, nema povratne veze o
+# polozaju); za pomeraj u deadband-u samo trajanje move() poziva
+ACT_COLS = ["ts","reason","angle","lux","motion","queue_ms","act_ms"]
+SERVO_PIN = int(os.getenv("SERVO_PIN", "18"))
+DEADBAND_DEG = float(os.getenv("SERVO_DEADBAND_DEG", "3"))  # manji pomeraji se preskacu
+SETTLE_S = float(os.getenv("SERVO_SETTLE_S", "0.5"))        # posle toga se PWM impuls gasi
+HYST_LUX = float(os.getenv("SERVO_HYST_LUX", "10"))
+DARK_LUX, BRIGHT_LUX = 50, 300
 
-def ensure_log_header():
-    if not LOG.exists():
-        with LOG.open("w", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(["ts","reason","angle","lux","motion"])
+_sampler = None
 
-def set_servo_angle(angle_deg, pin=18, freq=50):
-    if FAKE:
-        return True
-    try:
-        import RPi.GPIO as GPIO
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(pin, GPIO.OUT)
-        pwm = GPIO.PWM(pin, freq)
-        pwm.start(0)
-        duty = 2 + (angle_deg/18.0)
-        pwm.ChangeDutyCycle(duty)
-        time.sleep(0.5)
-        pwm.stop()
-        GPIO.cleanup()
-        return True
-    except Exception as e:
-        print("Servo error:", e)
-        return False
+class Servo:
+    # PWM kanal ostaje otvoren za ceo proces. Pomeraj manji od deadband-a se preskace;
+    # posle settle_s Timer gasi impuls (duty 0, bez trzanja), a novi pomeraj u tom
+    # periodu samo pomera tajmer, pa move() nikad ne blokira petlju. Svaki pomeraj
+    # dobija generaciju; tajmer zastarele generacije (vec okinut, ceka lock) ne gasi impuls.
+    def __init__(self, pin=SERVO_PIN, freq=50, deadband=DEADBAND_DEG, settle_s=SETTLE_S):
+        self.pin, self.freq, self.deadband, self.settle_s = pin, freq, deadband, settle_s
+        self.angle = None
+        self.moves = self.skipped = self.errors = 0
+        self._gen = 0
+        self.settle_t = None  # perf_counter kraja smirivanja poslednjeg pomeraja
+        self._gpio = self._pwm = self._timer = None
+        self._lock = threading.Lock()
+        if not FAKE:
+            self._open()
+        atexit.register(self.close)
+
+    def _open(self):
+        try:
+            import RPi.GPIO as GPIO
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self.pin, GPIO.OUT)
+            self._pwm = GPIO.PWM(self.pin, self.freq)
+            self._pwm.start(0)
+            self._gpio = GPIO
+        except Exception as e:
+            print("Servo error:", e)
+
+    def move(self, angle_deg):
+        # True ako je servo pomeren, False ako je komanda u deadband-u (ili greska)
+        angle_deg = max(0, min(180, angle_deg))
+        with self._lock:
+            if self.angle is not None and abs(angle_deg - self.angle) < self.deadband:
+                self.skipped += 1
+                return False
+            try:
+                if self._pwm is not None:
+                    self._pwm.ChangeDutyCycle(2 + (angle_deg/18.0))
+                    self._gen += 1
+                    if self._timer is not None:
+                        self._timer.cancel()
+                    self._timer = threading.Timer(self.settle_s, self._idle, args=(self._gen,))
+                    self._timer.daemon = True
+                    self._timer.start()
+                elif not FAKE:
+                    self.errors += 1
+                    return False
+            except Exception as e:
+                print("Servo error:", e)
+                self.errors += 1
+                return False
+            self.angle = angle_deg
+            self.moves += 1
+            self.settle_t = time.perf_counter() + self.settle_s
+            return True
+
+    def wait_settled(self):
+        # blokira do kraja smirivanja poslednjeg pomeraja
+        if self.settle_t is not None:
+            time.sleep(max(0.0, self.settle_t - time.perf_counter()))
+
+    def _idle(self, gen):
+        with self._lock:
+            if gen == self._gen and self._pwm is not None:
+                self._pwm.ChangeDutyCycle(0)
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pwm is not None:
+                self._pwm.stop()
+                self._pwm = None
+            if self._gpio is not None:
+                self._gpio.cleanup(self.pin)
+                self._gpio = None
+
+_servos = {}
+
+def set_servo_angle(angle_deg, pin=SERVO_PIN, freq=50):
+    # kompatibilnost: jedan Servo po pinu, otvoren pri prvom pozivu; False pri gresci
+    # (kao ranije), pomeraj u deadband-u nije greska
+    if pin not in _servos:
+        _servos[pin] = Servo(pin, freq)
+    servo = _servos[pin]
+    errors = servo.errors
+    servo.move(angle_deg)
+    return servo.errors == errors
 
-def decide_angle(lux, motion):
+def decide_angle(lux, motion, prev=None, hyst=HYST_LUX):
+    # prev = razlog prethodne odluke; iz dark_open/bright_close se izlazi tek kada
+    # lux predje prag za hyst (histereza oko 50/300 lux)
     if not motion:
         return 90, "no_presence"
     if lux is None:
         return 90, "no_lux"
-    if lux < 50:
+    if lux < DARK_LUX + (hyst if prev == "dark_open" else 0):
         return 30, "dark_open"
-    if lux > 300:
+    if lux > BRIGHT_LUX - (hyst if prev == "bright_close" else 0):
         return 150, "bright_close"
-    angle = 30 + (lux - 50) * (120.0 / 250.0)
+    angle = 30 + (lux - DARK_LUX) * (120.0 / (BRIGHT_LUX - DARK_LUX))
     return int(max(0, min(180, angle))), "linear_map"
 
 def read_snapshot():
+    global _sampler
     try:
-        snap = json.loads(subprocess.check_output(["python3", "sensors.py"]).decode("utf-8"))
-        return snap
+        if _sampler is None:
+            _sampler = sensor_daemon.open_sampler()
+        return _sampler.read()
     except Exception:
         return {"lux": None, "motion": 0}
 
 def loop():
-    ensure_log_header()
+    exit_on_sigterm()
+    log = CsvLog(LOG, ACT_COLS)
+    servo = Servo()
+    reason = None
     while True:
         s = read_snapshot()
         lux = s.get("lux")
         motion = s.get("motion") or 0
-        angle, reason = decide_angle(lux, motion)
-        set_servo_angle(angle)
-        with LOG.open("a", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow([datetime.utcnow().isoformat()+"Z", reason, angle, lux, motion])
-        time.sleep(2)
+        angle, reason = decide_angle(lux, motion, reason)
+        t0 = time.perf_counter()
+        if servo.move(angle):
+            servo.wait_settled()
+        act_ms = (time.perf_counter() - t0) * 1000.0
+        log.write([datetime.utcnow().isoformat()+"Z", reason, angle, lux, motion, None, act_ms])
+        time.sleep(max(0.0, 2 - (time.perf_counter() - t0)))
 
 if __name__ == "__main__":
     loop()
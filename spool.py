@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# spool.py - trajni red telemetrije (SQLite, WAL) za degradiran link: pod bad_net /
+# fallback snapshot-i se dodaju na kraj (jedan INSERT), a kada se link oporavi
+# prazne se u paketima od SPOOL_BATCH stavki pod token bucket-om od SPOOL_DRAIN_BPS
+# bajtova/s (budzet linka, racunato po wire_bytes). Granice: SPOOL_MAX_ROWS
+# (odbacuju se najstariji) i SPOOL_MAX_AGE_S.
+# python3 spool.py [db] ispisuje stanje reda.
+
+import os, sys, json, time, sqlite3
+
+DB = os.getenv("SPOOL_DB", "")  # npr. telemetry_spool.db; prazno = bez reda (bad_net agregacija u memoriji)
+MAX_ROWS = int(os.getenv("SPOOL_MAX_ROWS", "100000"))
+MAX_AGE_S = float(os.getenv("SPOOL_MAX_AGE_S", "86400"))
+BATCH = int(os.getenv("SPOOL_BATCH", "50"))
+DRAIN_BPS = float(os.getenv("SPOOL_DRAIN_BPS", "2000"))  # ~16 kbit/s od 256 kbit/s linka
+BURST_S = float(os.getenv("SPOOL_BURST_S", "5"))         # kapacitet bucket-a u sekundama protoka
+PRUNE_EVERY = 100
+
+class TokenBucket:
+    # dozvoljava dug: slanje krece dok ima tokena, stvarni wire_bytes se naplacuju posle
+    def __init__(self, rate, burst_s=BURST_S):
+        self.rate = rate
+        self.cap = rate * burst_s
+        self.tokens = self.cap
+        self.t = time.monotonic()
+
+    def available(self):
+        now = time.monotonic()
+        self.tokens = min(self.cap, self.tokens + (now - self.t) * self.rate)
+        self.t = now
+        return self.tokens
+
+    def charge(self, n):
+        self.available()
+        self.tokens -= n
+
+class Spool:
+    def __init__(self, path=DB, max_rows=MAX_ROWS, max_age_s=MAX_AGE_S):
+        self.path, self.max_rows, self.max_age_s = path, max_rows, max_age_s
+        self.db = sqlite3.connect(path, isolation_level=None)  # autocommit: svaki upis je transakcija
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS q (id INTEGER PRIMARY KEY AUTOINCREMENT, t REAL, body TEXT)")
+        self.depth = self.db.execute("SELECT COUNT(*) FROM q").fetchone()[0]
+        self.appended = self.dropped = 0
+        self._n = 0
+
+    def append(self, item):
+        self.db.execute("INSERT INTO q (t, body) VALUES (?, ?)", (time.time(), json.dumps(item, ensure_ascii=False)))
+        self.depth += 1
+        self.appended += 1
+        self._n += 1
+        if self.depth > self.max_rows:
+            self._drop_oldest(self.depth - self.max_rows)
+        if self._n >= PRUNE_EVERY:
+            self.prune()
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def _drop_oldest(self, n):
+        cur = self.db.execute("DELETE FROM q WHERE id IN (SELECT id FROM q ORDER BY id LIMIT ?)", (n,))
+        self.depth -= cur.rowcount
+        self.dropped += cur.rowcount
+
+    def prune(self):
+        # granica starosti; poziva se na svakih PRUNE_EVERY upisa i pre praznjenja
+        self._n = 0
+        if self.max_age_s > 0:
+            cur = self.db.execute("DELETE FROM q WHERE t < ?", (time.time() - self.max_age_s,))
+            self.depth -= cur.rowcount
+            self.dropped += cur.rowcount
+
+    def peek(self, n=BATCH):
+        rows = self.db.execute("SELECT id, body FROM q ORDER BY id LIMIT ?", (n,)).fetchall()
+        return [r[0] for r in rows], [json.loads(r[1]) for r in rows]
+
+    def ack(self, last_id):
+        cur = self.db.execute("DELETE FROM q WHERE id <= ?", (last_id,))
+        self.depth -= cur.rowcount
+
+    def oldest_age_s(self):
+        t = self.db.execute("SELECT t FROM q ORDER BY id LIMIT 1").fetchone()
+        return time.time() - t[0] if t else None
+
+    def close(self):
+        self.db.close()
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    path = argv[0] if argv else DB
+    if not path:
+        print("upotreba: spool.py <db> (ili SPOOL_DB)", file=sys.stderr)
+        return 2
+    s = Spool(path)
+    age = s.oldest_age_s()
+    print(json.dumps({"db": s.path, "depth": s.depth, "oldest_age_s": round(age, 1) if age is not None else None}))
+    s.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# telemetry.py - slanje snapshot-a senzora po odluci politike (proto/secure/qos).
+# Veze su perzistentne, po jedna za svaki (proto, secure) par:
+#   MQTT  TELEMETRY_TOPIC, TLS na MQTT_PORT ili bez TLS-a na MQTT_PLAIN_PORT
+#   CoAP  POST TELEMETRY_URL (coaps + DTLS PSK kada je secure), CON
+# Pod bad_net se TELEMETRY_BATCH snapshot-a spaja u jednu poruku (najduze
+# TELEMETRY_MAX_AGE_S); promena razloga politike prazni bafer.
+# Po poruci: payload_bytes, wire_bytes (procena aplikacionog sloja u oba smera +
+# TLS/DTLS zapis, bez TCP/UDP/IP zaglavlja) i pub_ms (QoS0: predato socket-u,
+# QoS1/2: PUBACK/PUBCOMP, CoAP: odgovor). Format payload-a je PAYLOAD_CODEC (codec.py),
+# naveden u MQTT v5 ContentType, odnosno CoAP Content-Format.
+# Sa trajnim redom (spool.py) se pod bad_net/fallback snapshot-i upisuju u red umesto
+# agregacije u memoriji, kao i stavke cije slanje nije uspelo; drain() ih salje u
+# paketima kada politika ponovo dozvoli slanje.
+
+import os, time, uuid, socket, asyncio, threading
+from datetime import datetime
+import codec as codec_mod
+import spool as spool_mod
+
+TOPIC = os.getenv("TELEMETRY_TOPIC", "iot/edge/telemetry")
+URL = os.getenv("TELEMETRY_URL", os.getenv("COAP_URL", "coap://localhost/echo").rsplit("/", 1)[0] + "/telemetry")
+BROKER = os.getenv("MQTT_HOST", "localhost")
+PORT = int(os.getenv("MQTT_PORT", "8883"))
+PLAIN_PORT = int(os.getenv("MQTT_PLAIN_PORT", "1883"))
+BATCH = int(os.getenv("TELEMETRY_BATCH", "3"))
+MAX_AGE_S = float(os.getenv("TELEMETRY_MAX_AGE_S", "60"))
+TIMEOUT = float(os.getenv("TELEMETRY_TIMEOUT", "4"))
+DEVICE = os.getenv("DEVICE_ID", socket.gethostname())
+TLS_REC = 22   # TLS 1.3 AES-GCM: zaglavlje 5 + tag 16 + tip 1
+DTLS_REC = 29  # DTLS 1.2 AES-CCM-8: zaglavlje 13 + nonce 8 + tag 8
+SPOOL_REASONS = ("bad_net", "fallback")
+
+def _varint_len(n):
+    k = 1
+    while n >= 128:
+        n >>= 7
+        k += 1
+    return k
+
+def mqtt_wire_bytes(topic, payload_len, qos, tls):
+    # MQTT v5 PUBLISH (bez property-ja) + potvrde za QoS1 (PUBACK) i QoS2 (REC/REL/COMP)
+    rem = 2 + len(topic.encode("utf-8")) + (2 if qos else 0) + 1 + payload_len
+    packets = [1 + _varint_len(rem) + rem] + [4] * {0: 0, 1: 1, 2: 3}[qos]
+    return sum(packets) + (TLS_REC * len(packets) if tls else 0)
+
+class MqttLink:
+    def __init__(self, secure, codec):
+        import paho.mqtt.client as mqtt
+        self.secure = secure
+        self.props = codec.mqtt_properties()
+        self.ready = threading.Event()
+        self.client = mqtt.Client(client_id=f"edge-tel-{uuid.uuid4().hex[:8]}", protocol=mqtt.MQTTv5)
+        if secure:
+            import mqtt_client
+            self.client.tls_set_context(mqtt_client.tls_context(BROKER))
+        self.client.on_connect = lambda *args: self.ready.set()
+        self.client.on_disconnect = lambda *args: self.ready.clear()
+        self.client.connect_async(BROKER, PORT if secure else PLAIN_PORT, keepalive=60)
+        self.client.loop_start()
+
+    def publish(self, payload, qos, timeout=TIMEOUT):
+        # blokira do potvrde (poziva se iz executor-a); vraca pub_ms ili None
+        t_end = time.perf_counter() + timeout
+        if not self.ready.wait(timeout):
+            return None
+        t0 = time.perf_counter()
+        info = self.client.publish(TOPIC, payload, qos=qos, properties=self.props)
+        if info.rc:
+            return None
+        try:
+            info.wait_for_publish(max(0.0, t_end - time.perf_counter()))
+        except (RuntimeError, ValueError):
+            return None
+        if not info.is_published():
+            return None
+        return (time.perf_counter() - t0) * 1000.0
+
+    def wire_bytes(self, payload_len, qos):
+        # + ContentType property (id 1 + duzina 2 + tekst)
+        ct = len(self.props.ContentType.encode("utf-8")) + 3
+        return mqtt_wire_bytes(TOPIC, payload_len, qos, self.secure) + ct
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+class CoapLink:
+    def __init__(self, secure, codec):
+        import coap_client
+        self.secure = secure
+        self.codec = codec
+        self.url = coap_client.dtls_url(URL) if secure else URL
+        self.ctx = None
+        self._coap_client = coap_client
+
+    async def start(self):
+        if self.ctx is None:
+            import aiocoap
+            self.url, _ = await self._coap_client.resolve_url(self.url)
+            ctx = await aiocoap.Context.create_client_context()
+            if self.secure:
+                origin = "/".join(self.url.split("/")[:3])
+                ctx.client_credentials.load_from_dict({
+                    origin + "/*": {"dtls": {"psk": self._coap_client.PSK.encode("utf-8"),
+                                             "client-identity": self._coap_client.PSK_ID.encode("utf-8")}}})
+            self.ctx = ctx
+        return self.ctx
+
+    async def publish(self, payload, timeout=TIMEOUT):
+        # vraca (pub_ms, wire_bytes); pub_ms None = bez uspesnog odgovora do roka
+        import aiocoap
+        ctx = await self.start()
+        req = aiocoap.Message(code=aiocoap.POST, mtype=aiocoap.CON, uri=self.url, payload=payload,
+                              content_format=self.codec.content_format)
+        t0 = time.perf_counter()
+        try:
+            resp = await asyncio.wait_for(ctx.request(req).response, timeout)
+        except Exception:
+            return None, None
+        pub_ms = (time.perf_counter() - t0) * 1000.0
+        # zahtev: kodiran kao poslat; odgovor (dolazni, ne moze se kodirati): zaglavlje 4 +
+        # token + opcije + 0xFF + payload
+        wire = len(req.copy(mid=0, token=resp.token).encode())
+        wire += 4 + len(resp.token) + len(resp.opt.encode()) + (1 + len(resp.payload) if resp.payload else 0)
+        if self.secure:
+            wire += 2 * DTLS_REC
+        return (pub_ms if resp.code.is_successful() else None), wire
+
+    async def close(self):
+        if self.ctx is not None:
+            await self.ctx.shutdown()
+            self.ctx = None
+
+class Publisher:
+    # send() vraca rezultat poslate poruke (n, payload_bytes, wire_bytes, pub_ms, ok)
+    # ili None kada je snapshot samo dodat u bafer za agregaciju (ili u spool).
+    def __init__(self, batch=BATCH, max_age_s=MAX_AGE_S, codec=None, spool=None):
+        self.codec = codec or codec_mod.get()
+        self.spool = spool
+        self.bucket = spool_mod.TokenBucket(spool_mod.DRAIN_BPS) if spool is not None else None
+        self.batch = max(1, batch)
+        self.max_age_s = max_age_s
+        self.links = {}
+        self.buf = []
+        self.buf_t = None
+        self.buf_reason = None
+
+    def encode(self, items):
+        if len(items) == 1:
+            body = {"dev": DEVICE, **items[0]}
+        else:
+            body = {"dev": DEVICE, "n": len(items), "items": items}
+        return self.codec.encode(body, compact=True)
+
+    def _link(self, proto, secure):
+        key = (proto, bool(secure))
+        if key not in self.links:
+            self.links[key] = MqttLink(secure, self.codec) if proto == "MQTT" else CoapLink(secure, self.codec)
+        return self.links[key]
+
+    def _take(self, policy, item):
+        # agregacija samo pod bad_net; promena razloga salje ono sto je nakupljeno
+        now = time.perf_counter()
+        if self.buf and policy["reason"] != self.buf_reason:
+            items, self.buf = self.buf + [item], []
+            return items
+        if policy["reason"] != "bad_net" or self.batch == 1:
+            return [item]
+        if not self.buf:
+            self.buf_t, self.buf_reason = now, policy["reason"]
+        self.buf.append(item)
+        if len(self.buf) >= self.batch or now - self.buf_t >= self.max_age_s:
+            items, self.buf = self.buf, []
+            return items
+        return None
+
+    async def send(self, policy, snap, timeout=TIMEOUT):
+        item = {"ts": datetime.utcnow().isoformat()+"Z", **snap}
+        if self.spool is None:
+            items = self._take(policy, item)
+            if items is None:
+                return None
+        elif policy["reason"] in SPOOL_REASONS:
+            self.spool.append(item)
+            return None
+        else:
+            items = [item]
+        res = await self._publish(policy, items, timeout)
+        if not res["ok"] and self.spool is not None:
+            self.spool.extend(items)
+        return res
+
+    async def drain(self, policy, timeout=TIMEOUT):
+        # paketi od spool.BATCH stavki dok ima tokena i vremena; posle svakog uspesnog
+        # slanja se potvrdjene stavke brisu iz reda (at-least-once)
+        if self.spool is None or policy["reason"] in SPOOL_REASONS or not self.spool.depth:
+            return None
+        self.spool.prune()
+        t0 = time.perf_counter()
+        t_end = t0 + timeout
+        n = wire = 0
+        while self.spool.depth and self.bucket.available() > 0 and time.perf_counter() < t_end:
+            ids, items = self.spool.peek(spool_mod.BATCH)
+            if not ids:
+                break
+            res = await self._publish(policy, items, t_end - time.perf_counter())
+            self.bucket.charge(res["wire_bytes"] or res["payload_bytes"])
+            if not res["ok"]:
+                break
+            self.spool.ack(ids[-1])
+            n += len(items)
+            wire += res["wire_bytes"] or 0
+        return {"n": n, "wire_bytes": wire, "ms": (time.perf_counter() - t0) * 1000.0}
+
+    async def _publish(self, policy, items, timeout):
+        payload = self.encode(items)
+        link = self._link(policy["proto"], policy["secure"])
+        if policy["proto"] == "MQTT":
+            qos = policy["qos"]
+            pub_ms = await asyncio.get_running_loop().run_in_executor(None, link.publish, payload, qos, timeout)
+            wire = link.wire_bytes(len(payload), qos)
+        else:
+            pub_ms, wire = await link.publish(payload, timeout)
+        return {"n": len(items), "payload_bytes": len(payload), "wire_bytes": wire,
+                "pub_ms": round(pub_ms, 3) if pub_ms is not None else None, "ok": int(pub_ms is not None)}
+
+    async def close(self):
+        for link in self.links.values():
+            if isinstance(link, CoapLink):
+                await link.close()
+            else:
+                link.close()
+        self.links = {}
+        if self.spool is not None:
+            self.spool.close()